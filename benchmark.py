@@ -0,0 +1,171 @@
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+# keeps pygame's import banner off stdout, where the results go without --out
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy as np
+import pygame
+
+from main import Game
+from scripts.stars import Stars
+from scripts.dust import Dusts
+
+# python benchmark.py [scenario ...] [--frames N] [--seed N] [--out results.json]
+
+SCENARIOS = {
+    'small': {'enemies': 10, 'sparks': 500, 'stars': 32, 'dust': 32},
+    'medium': {'enemies': 100, 'sparks': 2500, 'stars': 256, 'dust': 256},
+    'large': {'enemies': 500, 'sparks': 10000, 'stars': 1024, 'dust': 1024},
+}
+
+STAGES = ['stars', 'dust', 'tilemap', 'enemy_update', 'enemy_sight', 'enemy_render', 'spark_update', 'spark_render',
+          'outline', 'scale']
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def setup(game, scenario, seed):
+    random.seed(seed)
+    game.sparks.rng = np.random.default_rng(seed)
+    game.load_level(game.level)
+    game.sparks.clear()
+
+    game.stars = Stars(game.assets['stars'], count=scenario['stars'])
+    game.dust = Dusts(game.assets['dust'], count=scenario['dust'])
+
+    # stand enemies on random ground tiles so they patrol instead of falling out of the map
+    tilemap = game.tilemap
+    ground = sorted(tile['pos'] for tile in tilemap.tiles()
+                    if tilemap.physics_ids[tilemap.get_id(*tile['pos'])]
+                    and not tilemap.get_id(tile['pos'][0], tile['pos'][1] - 1))
+    game.enemies.clear()
+    game.enemies.rng = np.random.default_rng(seed)
+    for i in range(scenario['enemies']):
+        pos = random.choice(ground)
+        game.enemies.add((pos[0] * tilemap.tile_size, (pos[1] - 1) * tilemap.tile_size))
+
+
+def run_scenario(game, scenario, frames, seed):
+    setup(game, scenario, seed)
+    timings = {stage: [] for stage in STAGES}
+    center = game.player.rect().center
+    render_scroll = (int(game.scroll[0]), int(game.scroll[1]))
+
+    for frame in range(frames):
+        game.outline_display.fill((0, 0, 0, 0))
+        game.shadow_display.fill((0, 0, 0, 0))
+        game.display.fill((35, 39, 42))
+
+        t = time.perf_counter()
+        game.stars.update()
+        game.stars.render(game.display, offset=render_scroll)
+        timings['stars'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        game.dust.update()
+        game.dust.render(game.display, offset=render_scroll)
+        timings['dust'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        game.tilemap.render(game.outline_display, offset=render_scroll, shadow=game.shadow_display)
+        timings['tilemap'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        game.enemies.update(game.tilemap)
+        timings['enemy_update'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        game.enemies.visible(game.tilemap, center)
+        timings['enemy_sight'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        game.enemies.render(game.outline_display, offset=render_scroll, shadow=game.shadow_display)
+        timings['enemy_render'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        if len(game.sparks) < scenario['sparks']:
+            game.sparks.random_burst(center, scenario['sparks'] - len(game.sparks), max_speed=10)
+        game.sparks.update()
+        timings['spark_update'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        game.sparks.render(game.outline_display, game.colors, offset=render_scroll, shadow=game.shadow_display)
+        timings['spark_render'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        for offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+            game.display.blit(game.shadow_display, offset)
+        game.display.blit(game.outline_display, (0, 0))
+        timings['outline'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        # scales into the window like the game does when there's no screenshake, rather than allocating a surface
+        pygame.transform.scale(game.display, game.screen.get_size(), game.screen)
+        timings['scale'].append(time.perf_counter() - t)
+
+    results = {}
+    for stage, samples in timings.items():
+        samples = sorted(s * 1000 for s in samples)
+        results[stage] = {
+            'mean_ms': statistics.fmean(samples),
+            'median_ms': statistics.median(samples),
+            'p95_ms': samples[int(len(samples) * 0.95) - 1],
+            'max_ms': samples[-1],
+        }
+    results['total_mean_ms'] = sum(results[stage]['mean_ms'] for stage in STAGES)
+    return results
+
+
+def main(args):
+    frames = 300
+    seed = 0
+    out = None
+    names = []
+    while args:
+        arg = args.pop(0)
+        if arg == '--frames':
+            frames = int(args.pop(0))
+        elif arg == '--seed':
+            seed = int(args.pop(0))
+        elif arg == '--out':
+            out = args.pop(0)
+        elif arg in SCENARIOS:
+            names.append(arg)
+        else:
+            sys.exit(f'unknown argument {arg}, scenarios are {", ".join(SCENARIOS)}')
+
+    game = Game(headless=True)
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'frames': frames,
+        'seed': seed,
+        'scenarios': {},
+    }
+    for name in names or list(SCENARIOS):
+        stages = run_scenario(game, SCENARIOS[name], frames, seed)
+        report['scenarios'][name] = {'config': SCENARIOS[name], 'stages': stages}
+        print(f'{name}: {stages["total_mean_ms"]:.3f} ms/frame', file=sys.stderr)
+
+    if out:
+        with open(out, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,79 @@
+import os
+import random
+import sys
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from scripts.tilemap import Tilemap, AUTOTILE_MAP, AUTOTILE_TYPES
+
+# python -m checks.autotile [maps]
+# autotiles random maps with Tilemap.autotile and with the per-tile pass it replaced, then makes random edits through
+# autotile_around the way the editor does and checks every step against the per-tile pass, failing on any variant
+# that differs
+
+TYPES = ['grass', 'stone', 'decor', 'spawners']
+
+
+def reference(tiles):
+    # tiles maps (x, y) to [type, variant], autotiled in place one tile at a time
+    for (x, y), tile in tiles.items():
+        neighbors = set()
+        for shift in [(1, 0), (-1, 0), (0, -1), (0, 1)]:
+            neighbor = tiles.get((x + shift[0], y + shift[1]))
+            if neighbor and neighbor[0] == tile[0]:
+                neighbors.add(shift)
+        neighbors = tuple(sorted(neighbors))
+        if tile[0] in AUTOTILE_TYPES and neighbors in AUTOTILE_MAP:
+            tile[1] = AUTOTILE_MAP[neighbors]
+
+
+def snapshot(tilemap):
+    return {tuple(tile['pos']): [tile['type'], tile['variant']] for tile in tilemap.tiles()}
+
+
+def random_map(rnd):
+    # blobs of one type over a sparse scatter, spread across negative coords and chunk edges
+    tilemap = Tilemap(None)
+    for i in range(rnd.randint(1, 12)):
+        x, y = rnd.randint(-60, 60), rnd.randint(-40, 40)
+        tile_type = rnd.choice(TYPES)
+        for j in range(rnd.randint(10, 300)):
+            tilemap.set_tile(x + rnd.randint(-8, 8), y + rnd.randint(-5, 5), tile_type, rnd.randint(0, 8))
+    for i in range(rnd.randint(0, 200)):
+        tilemap.set_tile(rnd.randint(-70, 70), rnd.randint(-50, 50), rnd.choice(TYPES), rnd.randint(0, 8))
+    return tilemap
+
+
+def edit(tilemap, rnd):
+    # one paint or erase with autotiling on edit, as in the editor
+    x, y = rnd.randint(-30, 30), rnd.randint(-20, 20)
+    if rnd.random() < 0.7:
+        tile_type = rnd.choice(TYPES)
+        tilemap.set_tile(x, y, tile_type, tilemap.autotile_variant(x, y, tile_type, rnd.randint(0, 8)))
+    else:
+        tilemap.remove_tile(x, y)
+    tilemap.autotile_around(x, y)
+
+
+def main(args):
+    maps = int(args[0]) if args else 50
+    rnd = random.Random(0)
+    differing = edits = 0
+    for i in range(maps):
+        tilemap = random_map(rnd)
+        expected = snapshot(tilemap)
+        reference(expected)
+        tilemap.autotile()
+        differing += snapshot(tilemap) != expected
+        for j in range(20):
+            edit(tilemap, rnd)
+            expected = snapshot(tilemap)
+            reference(expected)
+            differing += snapshot(tilemap) != expected
+            edits += 1
+    print(f'{maps} maps and {edits} edits, {differing} differ from per-tile autotiling')
+    return 1 if differing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
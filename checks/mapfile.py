@@ -0,0 +1,102 @@
+import os
+import random
+import sys
+import tempfile
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from scripts.tilemap import Tilemap, map_path
+
+# python -m checks.mapfile [maps]
+# writes the bundled map and random maps as json and as binary .map, loads each back, into tilemaps that already
+# number some tile types differently, and fails on any tile, offgrid tile or index lookup that doesn't survive the
+# round trip, or when map_path picks a .map that wasn't baked from the json next to it
+
+TYPES = ['grass', 'stone', 'decor', 'large_decor', 'spawners', 'rope']
+
+
+def contents(tilemap):
+    tiles = sorted((tuple(tile['pos']), tile['type'], tile['variant']) for tile in tilemap.tiles())
+    offgrid = sorted((tuple(tile['pos']), tile['type'], tile['variant']) for tile in tilemap.offgrid_tiles.values())
+    return tilemap.tile_size, tiles, offgrid
+
+
+def index_errors(tilemap):
+    # tile_locations against a scan of every tile
+    expected = {}
+    for tile in tilemap.tiles():
+        expected.setdefault((tilemap.type_ids[tile['type']], tile['variant']), set()).add(tuple(tile['pos']))
+    errors = 0
+    for tile_id in range(1, len(tilemap.tile_types) + 1):
+        for variant in range(10):
+            locations = tilemap.tile_locations(tile_id, variant)
+            errors += len(set(locations)) != len(locations) or set(locations) != expected.get((tile_id, variant), set())
+    return errors
+
+
+def random_map(rnd):
+    tilemap = Tilemap(None, tile_size=rnd.choice([8, 16, 32]))
+    for i in range(rnd.randint(0, 2000)):
+        tilemap.set_tile(rnd.randint(-90, 90), rnd.randint(-70, 70), rnd.choice(TYPES), rnd.randint(0, 9))
+    for i in range(rnd.randint(0, 50)):
+        tilemap.add_offgrid({'type': rnd.choice(TYPES), 'variant': rnd.randint(0, 9),
+                             'pos': [rnd.uniform(-1000, 1000), rnd.uniform(-1000, 1000)]})
+    return tilemap
+
+
+def loaded(path, rnd):
+    # a tilemap that has already seen other types, so the file's type ids have to be remapped
+    tilemap = Tilemap(None)
+    for tile_type in rnd.sample(TYPES + ['water', 'lava'], rnd.randint(0, 5)):
+        tilemap.type_id(tile_type)
+    tilemap.load(path)
+    return tilemap
+
+
+def check_map_path(folder):
+    # the .map is only picked while it was baked from the json as it is now
+    base = os.path.join(folder, 'pick')
+    tilemap = random_map(random.Random(1))
+    wrong = 0
+    tilemap.save(base + '.json')
+    wrong += map_path(base) != base + '.json'
+    tilemap.save(base + '.map', source=base + '.json')
+    wrong += map_path(base) != base + '.map'
+    tilemap.set_tile(200, 200, 'stone')
+    tilemap.save(base + '.json')
+    wrong += map_path(base) != base + '.json'
+    tilemap.save(base + '.map')
+    wrong += map_path(base) != base + '.json'
+    os.remove(base + '.json')
+    wrong += map_path(base) != base + '.map'
+    return wrong
+
+
+def main(args):
+    maps = int(args[0]) if args else 100
+    rnd = random.Random(0)
+    bundled = Tilemap(None)
+    bundled.load('data/maps/0.json')
+    differing = errors = 0
+    with tempfile.TemporaryDirectory() as folder:
+        for i in range(maps + 1):
+            tilemap = bundled if i == 0 else random_map(rnd)
+            expected = contents(tilemap)
+            base = os.path.join(folder, str(i))
+            tilemap.save(base + '.json')
+            tilemap.save(base + '.map', source=base + '.json')
+            binary = loaded(base + '.map', rnd)
+            differing += contents(loaded(base + '.json', rnd)) != expected
+            differing += contents(binary) != expected
+            errors += index_errors(binary)
+            # and back out of the binary map to json
+            binary.save(base + '.json')
+            differing += contents(loaded(base + '.json', rnd)) != expected
+        wrong = check_map_path(folder)
+    print(f'{maps} random maps and the bundled one, {differing} round trips changed the map, {errors} index lookups '
+          f'differ from a scan, {wrong} map_path picks were wrong')
+    return 1 if differing or errors or wrong else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,204 @@
+import os
+import random
+import sys
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy as np
+import pygame
+
+from main import Game
+from scripts.tilemap import PHYSICS_TILES
+
+# python -m checks.ruhaans [ticks]
+# steps a batch of enemies with Ruhaans.update and a copy of each with the per-enemy Ruhaan.update they replaced, on
+# the same random rolls, and fails on any difference in position, patrol or animation state, in what Ruhaans.render
+# draws, or between Ruhaans.collide and a brute force overlap test
+
+SIZE = (427, 240)
+
+
+class Ruhaan:
+    # one enemy the way PhysicsEntity.update and Ruhaan.update moved it before enemies were batched
+    def __init__(self, pos, periods):
+        self.pos = list(pos)
+        self.velocity = [0, 0]
+        self.collisions = {'up': False, 'down': False, 'right': False, 'left': False}
+        self.flip = False
+        self.walking = 0
+        self.action = 'idle'
+        self.frame = 0
+        self.periods = periods
+
+    def rect(self):
+        return pygame.Rect(self.pos[0], self.pos[1], 16, 16)
+
+    def update(self, tilemap, roll, walk):
+        movement = (0, 0)
+        if self.walking:
+            if tilemap.solid_check((self.rect().centerx + (-7 if self.flip else 7), self.pos[1] + 23)):
+                if self.collisions['right'] or self.collisions['left']:
+                    self.flip = not self.flip
+                else:
+                    movement = (-0.5 if self.flip else 0.5, 0)
+            else:
+                self.flip = not self.flip
+            self.walking = max(0, self.walking - 1)
+        elif roll < 0.01:
+            self.walking = walk
+
+        self.collisions = {'up': False, 'down': False, 'right': False, 'left': False}
+        frame_movement = (movement[0] + self.velocity[0], movement[1] + self.velocity[1])
+
+        self.pos[0] += frame_movement[0]
+        entity_rect = self.rect()
+        for rect in physics_rects_around(tilemap, self.pos):
+            if entity_rect.colliderect(rect):
+                if frame_movement[0] > 0:
+                    entity_rect.right = rect.left
+                    self.collisions['right'] = True
+                if frame_movement[0] < 0:
+                    entity_rect.left = rect.right
+                    self.collisions['left'] = True
+                self.pos[0] = entity_rect.x
+
+        self.pos[1] += frame_movement[1]
+        entity_rect = self.rect()
+        for rect in physics_rects_around(tilemap, self.pos):
+            if entity_rect.colliderect(rect):
+                if frame_movement[1] > 0:
+                    entity_rect.bottom = rect.top
+                    self.collisions['down'] = True
+                if frame_movement[1] < 0:
+                    entity_rect.top = rect.bottom
+                    self.collisions['up'] = True
+                self.pos[1] = entity_rect.y
+
+        if movement[0] > 0:
+            self.flip = False
+        if movement[0] < 0:
+            self.flip = True
+        self.velocity[1] = min(5, self.velocity[1] + 0.1)
+        if self.collisions['down'] or self.collisions['up']:
+            self.velocity[1] = 0
+
+        # Animation.update on the current action, then set_action starts the new one from its first frame
+        self.frame = (self.frame + 1) % self.periods[self.action]
+        action = 'run' if movement[0] != 0 else 'idle'
+        if action != self.action:
+            self.action = action
+            self.frame = 0
+
+    def render(self, assets, surf, offset, shadow):
+        animation = assets['ruhaan/' + self.action]
+        index = self.frame // animation.img_duration
+        pos = (self.pos[0] - offset[0], self.pos[1] - offset[1])
+        surf.blit(animation.frames[self.flip][index], pos)
+        shadow.blit(animation.shadows[self.flip][index], pos, special_flags=pygame.BLEND_RGBA_MAX)
+
+
+def physics_rects_around(tilemap, pos):
+    return [pygame.Rect(tile['pos'][0] * tilemap.tile_size, tile['pos'][1] * tilemap.tile_size, tilemap.tile_size,
+                        tilemap.tile_size) for tile in tilemap.tiles_around(pos) if tile['type'] in PHYSICS_TILES]
+
+
+class Rolls:
+    # stands in for the batch's Generator, handing out the same rolls the reference enemies get
+    def __init__(self, rolls, walks):
+        self.rolls = rolls
+        self.walks = walks
+        self.tick = 0
+
+    def random(self, out):
+        out[:] = self.rolls[self.tick]
+        return out
+
+    def integers(self, low, high, size):
+        return np.full(size, self.walks[self.tick])
+
+
+def starts(tilemap, amount, rnd):
+    # dropped a little above the tops of solid tiles, clear of any tile, so most of them land and patrol
+    ground = sorted(tile['pos'] for tile in tilemap.tiles() if tile['type'] in PHYSICS_TILES
+                    and not tilemap.solid_check((tile['pos'][0] * 16, (tile['pos'][1] - 1) * 16)))
+    positions = []
+    for x, y in rnd.choices(ground, k=amount * 2):
+        pos = (x * 16 + rnd.random() * 8, (y - 1) * 16 - rnd.random() * 40)
+        if pygame.Rect(pos[0], pos[1], 16, 16).collidelist(physics_rects_around(tilemap, pos)) == -1:
+            positions.append(pos)
+    return positions[:amount]
+
+
+def compare_render(game, batch, enemies):
+    differing = 0
+    for offset in [(0, 0), (-200, 50), (100, 100), (350.5, -20.25)]:
+        surfs = [pygame.Surface(SIZE, pygame.SRCALPHA) for i in range(4)]
+        for enemy in enemies:
+            enemy.render(game.assets, surfs[0], offset, surfs[1])
+        batch.render(surfs[2], offset, shadow=surfs[3])
+        differing += pygame.image.tobytes(surfs[0], 'RGBA') != pygame.image.tobytes(surfs[2], 'RGBA')
+        differing += pygame.image.tobytes(surfs[1], 'RGBA') != pygame.image.tobytes(surfs[3], 'RGBA')
+    return differing
+
+
+def compare_collide(batch, rnd, tests=5000):
+    mismatches = 0
+    for i in range(tests):
+        rect = (rnd.randint(-350, 950), rnd.randint(-250, 650), rnd.randint(0, 60), rnd.randint(0, 60))
+        corners = batch.rects()
+        brute = np.flatnonzero((corners[:, 0] < rect[0] + rect[2]) & (corners[:, 0] + 16 > rect[0])
+                               & (corners[:, 1] < rect[1] + rect[3]) & (corners[:, 1] + 16 > rect[1]))
+        mismatches += not np.array_equal(brute, batch.collide(rect))
+        # moves and removals invalidate the broad-phase buckets
+        if i % 250 == 0:
+            batch.pos[:batch.count] += np.random.default_rng(i).uniform(-3, 3, (batch.count, 2))
+            batch.moved = True
+        if i % 500 == 0 and batch.count > 5:
+            batch.remove([0, 5])
+    return mismatches
+
+
+def main(args):
+    ticks = int(args[0]) if args else 1000
+    game = Game(headless=True, seed=0)
+    tilemap = game.tilemap
+    periods = {action: game.assets['ruhaan/' + action].img_duration * len(game.assets['ruhaan/' + action].images)
+               for action in ['idle', 'run']}
+    positions = starts(tilemap, 150, random.Random(5))
+    rolls = np.random.default_rng(1).random((ticks, len(positions))) * 0.2
+    walks = np.random.default_rng(2).integers(30, 121, ticks)
+
+    batch = game.enemies
+    batch.clear()
+    for pos in positions:
+        batch.add(pos)
+    batch.rng = Rolls(rolls, walks)
+    enemies = [Ruhaan(pos, periods) for pos in positions]
+
+    differing = 0
+    for tick in range(ticks):
+        batch.rng.tick = tick
+        batch.update(tilemap)
+        for i, enemy in enumerate(enemies):
+            enemy.update(tilemap, rolls[tick, i], int(walks[tick]))
+            differing += (enemy.pos != batch.pos[i].tolist() or enemy.flip != batch.flip[i]
+                          or enemy.walking != batch.walking[i] or enemy.frame != batch.frame[i]
+                          or (enemy.action == 'run') != batch.action[i])
+    walking = int(np.count_nonzero(batch.walking[:batch.count]))
+    print(f'{len(enemies)} enemies over {ticks} ticks, {walking} walking at the end, '
+          f'{differing} enemy ticks differ from Ruhaan.update')
+
+    drawn = compare_render(game, batch, enemies)
+    print(f'{drawn} rendered layers differ from per-enemy blits')
+
+    mismatches = compare_collide(batch, random.Random(3))
+    print(f'{mismatches} collide results differ from a brute force overlap test')
+    return 1 if differing or drawn or mismatches else 0
+
+
+if __name__ == '__main__':
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,79 @@
+import math
+import os
+import random
+import sys
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy as np
+
+from scripts.tilemap import Tilemap, map_path
+
+# python -m checks.sight [segments]
+# casts random segments over the bundled map with Tilemap.raycast and by clipping the segment against every solid
+# tile in its bounding box, then tests them all with one Tilemap.line_of_sight call, per segment and towards a shared
+# point, and fails on any hit tile, hit point or clear/blocked answer that differs
+
+
+def reference(tilemap, start, end):
+    # first solid tile the segment enters, by slab clipping against each tile box, as (t, point, tile) or None
+    size = tilemap.tile_size
+    delta = (end[0] - start[0], end[1] - start[1])
+    first = None
+    for x in range(int(min(start[0], end[0]) // size), int(max(start[0], end[0]) // size) + 1):
+        for y in range(int(min(start[1], end[1]) // size), int(max(start[1], end[1]) // size) + 1):
+            if not tilemap.physics_ids[tilemap.get_id(x, y)]:
+                continue
+            enter, leave = 0, 1
+            for axis, low in ((0, x * size), (1, y * size)):
+                if delta[axis]:
+                    a = (low - start[axis]) / delta[axis]
+                    b = (low + size - start[axis]) / delta[axis]
+                    enter = max(enter, min(a, b))
+                    leave = min(leave, max(a, b))
+                elif not low <= start[axis] < low + size:
+                    leave = -1
+            if enter <= leave and (first is None or enter < first[0]):
+                first = (enter, (start[0] + delta[0] * enter, start[1] + delta[1] * enter), (x, y))
+    return first
+
+
+def segments(rnd, amount):
+    for i in range(amount):
+        start = (rnd.uniform(-500, 600), rnd.uniform(-100, 700))
+        end = (start[0] + rnd.uniform(-200, 200), start[1] + rnd.uniform(-200, 200))
+        # axis aligned segments take the branches where one delta is zero
+        if rnd.random() < 0.1:
+            end = (end[0], start[1])
+        elif rnd.random() < 0.1:
+            end = (start[0], end[1])
+        yield start, end
+
+
+def main(args):
+    amount = int(args[0]) if args else 5000
+    tilemap = Tilemap(None)
+    tilemap.load(map_path('data/maps/0'))
+    pairs = list(segments(random.Random(2), amount))
+
+    differing = 0
+    for start, end in pairs:
+        expected = reference(tilemap, start, end)
+        got = tilemap.raycast(start, end)
+        if expected is None or got is None:
+            differing += expected is not got
+        else:
+            differing += got[1] != expected[2] or math.dist(got[0], expected[1]) > 1e-6
+    clear = tilemap.line_of_sight([start for start, end in pairs], [end for start, end in pairs])
+    mismatches = sum(clear[i] != (reference(tilemap, *pairs[i]) is None) for i in range(len(pairs)))
+    target = (100.0, 300.0)
+    towards = tilemap.line_of_sight(np.array([start for start, end in pairs]), target)
+    mismatches += sum(towards[i] != (reference(tilemap, pairs[i][0], target) is None) for i in range(len(pairs)))
+
+    print(f'{amount} segments, {int(clear.sum())} clear, {differing} raycasts and {mismatches} line of sight '
+          f'results differ from clipping against the tiles')
+    return 1 if differing or mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,83 @@
+import os
+import sys
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy as np
+import pygame
+
+from scripts.spark import Sparks
+from scripts.utils import SHADOW_COLOR
+
+# python -m checks.sparks [batches]
+# renders random spark batches with Sparks.render and with one draw.polygon per spark, the way sparks were first
+# drawn, and fails on any pixel that differs, in the sprite layer or the shadow
+
+SIZE = (427, 240)
+COLORS = [(230, 74, 34), (230, 74, 34), (245, 155, 66), (255, 255, 255), (0, 0, 0), (50, 50, 50)]
+
+
+def reference(sparks, surf, colors, offset, shadow, color_rng):
+    live = np.flatnonzero(sparks.live[:sparks.count]).tolist()
+    chosen = iter(color_rng.integers(len(colors), size=len(live)).tolist())
+    for i in live:
+        x, y = sparks.pos[i] - offset
+        speed = sparks.speed[i]
+        cos, sin = sparks.direction[i]
+        reach = speed * 3 + 1
+        if not (-reach < x < surf.get_width() + reach and -reach < y < surf.get_height() + reach):
+            continue
+        quad = [(x + cos * speed * 3, y + sin * speed * 3), (x - sin * speed * 0.5, y + cos * speed * 0.5),
+                (x - cos * speed * 3, y - sin * speed * 3), (x + sin * speed * 0.5, y - cos * speed * 0.5)]
+        color = colors[next(chosen)]
+        pygame.draw.polygon(surf, color, quad)
+        if shadow:
+            pygame.draw.polygon(shadow, SHADOW_COLOR, quad)
+
+
+def backdrop(rng):
+    # some sprite pixels and silhouettes already drawn, like the frame sparks render into
+    surf = pygame.Surface(SIZE, pygame.SRCALPHA)
+    shadow = pygame.Surface(SIZE, pygame.SRCALPHA)
+    for i in range(20):
+        rect = (int(rng.integers(SIZE[0])), int(rng.integers(SIZE[1])), 16, 16)
+        surf.fill((int(rng.integers(256)), 80, 40, 255), rect)
+        shadow.fill(SHADOW_COLOR, rect)
+    return surf, shadow
+
+
+def main(args):
+    batches = int(args[0]) if args else 50
+    rng = np.random.default_rng(0)
+    differing = total = 0
+    for batch in range(batches):
+        sparks = Sparks()
+        center = rng.uniform((-20, -20), (SIZE[0] + 20, SIZE[1] + 20))
+        sparks.burst(center, rng.uniform(0, np.pi * 2, 200), rng.uniform(0, 10, 200))
+        for i in range(int(rng.integers(0, 40))):
+            sparks.update()
+        offset = rng.uniform(-30, 30, 2)
+        with_shadow = batch % 4 != 3
+
+        seed = int(rng.integers(1 << 32))
+        surf, shadow = backdrop(np.random.default_rng(seed))
+        sparks.color_rng = np.random.default_rng(seed)
+        sparks.render(surf, COLORS, offset=offset, shadow=shadow if with_shadow else None)
+        expected, expected_shadow = backdrop(np.random.default_rng(seed))
+        reference(sparks, expected, COLORS, offset, expected_shadow if with_shadow else None,
+                  np.random.default_rng(seed))
+
+        for got, want in ((surf, expected), (shadow, expected_shadow)):
+            a = pygame.surfarray.array3d(got) != pygame.surfarray.array3d(want)
+            b = pygame.surfarray.array_alpha(got) != pygame.surfarray.array_alpha(want)
+            differing += int((a.any(axis=2) | b).sum())
+            total += SIZE[0] * SIZE[1]
+    print(f'{batches} batches, {differing} of {total} pixels differ from draw.polygon')
+    return 1 if differing else 0
+
+
+if __name__ == '__main__':
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    sys.exit(main(sys.argv[1:]))
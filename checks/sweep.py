@@ -0,0 +1,65 @@
+import os
+import random
+import sys
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+
+from scripts.tilemap import Tilemap, map_path
+
+# python -m checks.sweep [moves]
+# slides random hitboxes along one axis with Tilemap.sweep and by stepping one pixel at a time until the next step
+# would overlap a solid tile, on the bundled map while tiles are added and removed, and fails on any move that ends
+# somewhere else or disagrees about being blocked
+
+TYPES = ['grass', 'stone', 'decor']
+
+
+def overlaps(tilemap, x, y, w, h):
+    size = tilemap.tile_size
+    return any(tilemap.physics_ids[tilemap.get_id(px // size, py // size)]
+               for px in {x + w - 1} | set(range(x, x + w, size)) for py in {y + h - 1} | set(range(y, y + h, size)))
+
+
+def reference(tilemap, x, y, w, h, axis, distance):
+    pos = [x, y]
+    step = 1 if distance > 0 else -1
+    for i in range(abs(distance)):
+        pos[axis] += step
+        if overlaps(tilemap, pos[0], pos[1], w, h):
+            return pos[axis] - step, True
+    return pos[axis], False
+
+
+def main(args):
+    moves = int(args[0]) if args else 20000
+    rnd = random.Random(1)
+    tilemap = Tilemap(None)
+    tilemap.load(map_path('data/maps/0'))
+    differing = blocked = tested = 0
+    while tested < moves:
+        # edits drop the cached solid grid and spans
+        if tested % 500 == 0:
+            for i in range(10):
+                x, y = rnd.randint(-35, 40), rnd.randint(-10, 45)
+                if rnd.random() < 0.5:
+                    tilemap.set_tile(x, y, rnd.choice(TYPES))
+                else:
+                    tilemap.remove_tile(x, y)
+        x, y = rnd.randrange(-500, 600), rnd.randrange(-100, 700)
+        w, h = rnd.randrange(1, 40), rnd.randrange(1, 40)
+        if overlaps(tilemap, x, y, w, h):
+            continue
+        axis = rnd.randrange(2)
+        distance = rnd.randrange(-80, 81)
+        expected = reference(tilemap, x, y, w, h, axis, distance)
+        differing += tilemap.sweep(pygame.Rect(x, y, w, h), axis, (x, y)[axis] + distance) != expected
+        blocked += expected[1]
+        tested += 1
+    print(f'{tested} moves, {blocked} blocked, {differing} differ from stepping a pixel at a time')
+    return 1 if differing else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
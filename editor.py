@@ -2,10 +2,17 @@ import sys
 
 import pygame
 
-from scripts.utils import load_images, load_image
-from scripts.tilemap import Tilemap
+from scripts.utils import load_atlas, load_images
+from scripts.assets import Assets
+from scripts.tilemap import Tilemap, map_path
 
 RENDER_SCALE = 2.0
+# repaint only what changed and sleep while idle, False redraws the whole window every frame
+DIRTY_REDRAW = True
+# keep autotiled types connected while painting, T still autotiles the whole map
+AUTOTILE_ON_EDIT = True
+# the selected tile preview in the top left corner
+PREVIEW_RECT = (4, 4, 34, 34)
 
 
 class Editor:
@@ -16,23 +23,21 @@ class Editor:
         self.screen = pygame.display.set_mode((854, 480))
         self.display = pygame.Surface((427, 240))
 
+        load_atlas()
+
         self.clock = pygame.time.Clock()
 
-        self.assets = {
-            'default': load_images('tiles/default'),
-            'grass': load_images('tiles/grass'),
-            'pillar': load_images('tiles/pillar'),
-            'platform': load_images('tiles/platform'),
-            'rope': load_images('tiles/rope'),
-            'spawners': load_images('tiles/spawners'),
-        }
+        self.assets = Assets()
+        for tile_type in ['default', 'grass', 'pillar', 'platform', 'rope', 'spawners']:
+            self.assets.add(tile_type, load_images, 'tiles/' + tile_type)
+        self.assets.preload()
 
         self.movement = [False, False, False, False]
 
         self.tilemap = Tilemap(self, tile_size=16)
 
         try:
-            self.tilemap.load('data/maps/0.json')
+            self.tilemap.load(map_path('data/maps/0'))
         except FileNotFoundError:
             pass
 
@@ -47,111 +52,192 @@ class Editor:
         self.shift = False
         self.ongrid = True
 
-    def run(self):
-        while True:
-            self.display.fill((0, 0, 0))
-
+        self.mpos = (0, 0)
+        self.tile_pos = (0, 0)
+        self.dirty = None
+
+    def mark_dirty(self, rect=None):
+        # rects are in display space, None repaints everything
+        if rect is None or self.dirty is None:
+            self.dirty = None
+        else:
+            self.dirty.append(pygame.Rect(rect))
+
+    def tile_rect(self, tile_pos):
+        return (tile_pos[0] * self.tilemap.tile_size - self.scroll[0], tile_pos[1] * self.tilemap.tile_size - self.scroll[1],
+                self.tilemap.tile_size, self.tilemap.tile_size)
+
+    def edited(self, tile_pos):
+        self.mark_dirty(self.tile_rect(tile_pos))
+        if AUTOTILE_ON_EDIT and self.tilemap.autotile_around(tile_pos[0], tile_pos[1]):
+            self.mark_dirty(pygame.Rect(self.tile_rect(tile_pos)).inflate(self.tilemap.tile_size * 2,
+                                                                         self.tilemap.tile_size * 2))
+
+    def ghost_rect(self, mpos, tile_pos):
+        img = self.assets[self.tile_list[self.tile_group]][self.tile_variant]
+        if self.ongrid:
+            pos = (tile_pos[0] * self.tilemap.tile_size - self.scroll[0], tile_pos[1] * self.tilemap.tile_size - self.scroll[1])
+        else:
+            pos = mpos
+        # one pixel of slack for float positions
+        return pygame.Rect(pos[0] - 1, pos[1] - 1, img.get_width() + 2, img.get_height() + 2)
+
+    def handle_events(self):
+        if DIRTY_REDRAW and not any(self.movement) and self.dirty == []:
+            # nothing is moving or waiting to be drawn, so sleep until there is input
+            events = [pygame.event.wait()] + pygame.event.get()
+        else:
+            events = pygame.event.get()
+
+        for event in events:
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button == 1:
+                    self.clicking = True
+                    if not self.ongrid:
+                        self.tilemap.add_offgrid(
+                            {'type': self.tile_list[self.tile_group], 'variant': self.tile_variant,
+                             'pos': (self.mpos[0] + self.scroll[0], self.mpos[1] + self.scroll[1])})
+                        self.mark_dirty(self.ghost_rect(self.mpos, self.tile_pos))
+                if event.button == 3:
+                    self.right_clicking = True
+                if event.button in {4, 5}:
+                    # the old ghost may be larger than the new one
+                    self.mark_dirty(self.ghost_rect(self.mpos, self.tile_pos))
+                if self.shift:
+                    if event.button == 4:
+                        self.tile_variant = (self.tile_variant - 1) % len(
+                            self.assets[self.tile_list[self.tile_group]])
+                    if event.button == 5:
+                        self.tile_variant = (self.tile_variant + 1) % len(
+                            self.assets[self.tile_list[self.tile_group]])
+                else:
+                    if event.button == 4:
+                        self.tile_group = (self.tile_group - 1) % len(self.tile_list)
+                        self.tile_variant = 0
+                    if event.button == 5:
+                        self.tile_group = (self.tile_group + 1) % len(self.tile_list)
+                        self.tile_variant = 0
+                if event.button in {4, 5}:
+                    self.mark_dirty(self.ghost_rect(self.mpos, self.tile_pos))
+                    self.mark_dirty(PREVIEW_RECT)
+            if event.type == pygame.MOUSEBUTTONUP:
+                if event.button == 1:
+                    self.clicking = False
+                if event.button == 3:
+                    self.right_clicking = False
+
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_a:
+                    self.movement[0] = True
+                if event.key == pygame.K_d:
+                    self.movement[1] = True
+                if event.key == pygame.K_w:
+                    self.movement[2] = True
+                if event.key == pygame.K_s:
+                    self.movement[3] = True
+                if event.key == pygame.K_g:
+                    self.mark_dirty(self.ghost_rect(self.mpos, self.tile_pos))
+                    self.ongrid = not self.ongrid
+                    self.mark_dirty(self.ghost_rect(self.mpos, self.tile_pos))
+                if event.key == pygame.K_t:
+                    self.tilemap.autotile()
+                    self.mark_dirty()
+                if event.key == pygame.K_o:
+                    name = input("enter map name: ")
+                    self.tilemap.save(f'data/maps/{name}.json')
+                    self.tilemap.save(f'data/maps/{name}.map', source=f'data/maps/{name}.json')
+                if event.key == pygame.K_LSHIFT:
+                    self.shift = True
+            if event.type == pygame.KEYUP:
+                if event.key == pygame.K_a:
+                    self.movement[0] = False
+                if event.key == pygame.K_d:
+                    self.movement[1] = False
+                if event.key == pygame.K_w:
+                    self.movement[2] = False
+                if event.key == pygame.K_s:
+                    self.movement[3] = False
+                if event.key == pygame.K_LSHIFT:
+                    self.shift = False
+
+            if event.type == pygame.WINDOWEXPOSED:
+                self.mark_dirty()
+
+    def update(self):
+        if any(self.movement):
             self.scroll[0] += (self.movement[1] - self.movement[0]) * 2
             self.scroll[1] += (self.movement[3] - self.movement[2]) * 2
-            render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
-
-            self.tilemap.render(self.display, offset=render_scroll)
-
-            current_tile_img = self.assets[self.tile_list[self.tile_group]][self.tile_variant].copy()
-            current_tile_img.set_alpha(100)
-
-            mpos = pygame.mouse.get_pos()
-            mpos = (mpos[0] / RENDER_SCALE, mpos[1] / RENDER_SCALE)
-            tile_pos = (int((mpos[0] + self.scroll[0]) // self.tilemap.tile_size),
-                        int((mpos[1] + self.scroll[1]) // self.tilemap.tile_size))
-
-            if self.ongrid:
-                self.display.blit(current_tile_img, (tile_pos[0] * self.tilemap.tile_size - self.scroll[0],
-                                                     tile_pos[1] * self.tilemap.tile_size - self.scroll[1]))
-            else:
-                self.display.blit(current_tile_img, mpos)
-
-            if self.clicking and self.ongrid:
-                self.tilemap.tilemap[str(tile_pos[0]) + ';' + str(tile_pos[1])] = {
-                    'type': self.tile_list[self.tile_group], 'variant': self.tile_variant, 'pos': tile_pos}
-            if self.right_clicking:
-                tile_loc = str(tile_pos[0]) + ';' + str(tile_pos[1])
-                if tile_loc in self.tilemap.tilemap:
-                    del self.tilemap.tilemap[tile_loc]
-                for tile in self.tilemap.offgrid_tiles.copy():
-                    tile_img = self.assets[tile['type']][tile['variant']]
-                    tile_r = pygame.Rect(tile['pos'][0] - self.scroll[0], tile['pos'][1] - self.scroll[1],
-                                         tile_img.get_width(), tile_img.get_height())
-                    if tile_r.collidepoint(mpos):
-                        self.tilemap.offgrid_tiles.remove(tile)
-
-            self.display.blit(current_tile_img, (5, 5))
-
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    if event.button == 1:
-                        self.clicking = True
-                        if not self.ongrid:
-                            self.tilemap.offgrid_tiles.append(
-                                {'type': self.tile_list[self.tile_group], 'variant': self.tile_variant,
-                                 'pos': (mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])})
-                    if event.button == 3:
-                        self.right_clicking = True
-                    if self.shift:
-                        if event.button == 4:
-                            self.tile_variant = (self.tile_variant - 1) % len(
-                                self.assets[self.tile_list[self.tile_group]])
-                        if event.button == 5:
-                            self.tile_variant = (self.tile_variant + 1) % len(
-                                self.assets[self.tile_list[self.tile_group]])
-                    else:
-                        if event.button == 4:
-                            self.tile_group = (self.tile_group - 1) % len(self.tile_list)
-                            self.tile_variant = 0
-                        if event.button == 5:
-                            self.tile_group = (self.tile_group + 1) % len(self.tile_list)
-                            self.tile_variant = 0
-                if event.type == pygame.MOUSEBUTTONUP:
-                    if event.button == 1:
-                        self.clicking = False
-                    if event.button == 3:
-                        self.right_clicking = False
-
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_a:
-                        self.movement[0] = True
-                    if event.key == pygame.K_d:
-                        self.movement[1] = True
-                    if event.key == pygame.K_w:
-                        self.movement[2] = True
-                    if event.key == pygame.K_s:
-                        self.movement[3] = True
-                    if event.key == pygame.K_g:
-                        self.ongrid = not self.ongrid
-                    if event.key == pygame.K_t:
-                        self.tilemap.autotile()
-                    if event.key == pygame.K_o:
-                        self.tilemap.save(f'data/maps/{input("enter map name: ")}.json')
-                    if event.key == pygame.K_LSHIFT:
-                        self.shift = True
-                if event.type == pygame.KEYUP:
-                    if event.key == pygame.K_a:
-                        self.movement[0] = False
-                    if event.key == pygame.K_d:
-                        self.movement[1] = False
-                    if event.key == pygame.K_w:
-                        self.movement[2] = False
-                    if event.key == pygame.K_s:
-                        self.movement[3] = False
-                    if event.key == pygame.K_LSHIFT:
-                        self.shift = False
-
-            self.screen.blit(pygame.transform.scale(self.display, self.screen.get_size()), (0, 0))
-            pygame.display.update()
+            self.mark_dirty()
+
+        mpos = pygame.mouse.get_pos()
+        mpos = (mpos[0] / RENDER_SCALE, mpos[1] / RENDER_SCALE)
+        tile_pos = (int((mpos[0] + self.scroll[0]) // self.tilemap.tile_size),
+                    int((mpos[1] + self.scroll[1]) // self.tilemap.tile_size))
+        if mpos != self.mpos or tile_pos != self.tile_pos:
+            self.mark_dirty(self.ghost_rect(self.mpos, self.tile_pos))
+            self.mark_dirty(self.ghost_rect(mpos, tile_pos))
+            self.mpos = mpos
+            self.tile_pos = tile_pos
+
+        if self.clicking and self.ongrid:
+            tile_type = self.tile_list[self.tile_group]
+            variant = self.tile_variant
+            if AUTOTILE_ON_EDIT:
+                # write the variant autotiling would settle on, so holding the button over a tile changes nothing
+                variant = self.tilemap.autotile_variant(tile_pos[0], tile_pos[1], tile_type, variant)
+            if self.tilemap.set_tile(tile_pos[0], tile_pos[1], tile_type, variant):
+                self.edited(tile_pos)
+        if self.right_clicking:
+            if self.tilemap.remove_tile(tile_pos[0], tile_pos[1]):
+                self.edited(tile_pos)
+            for tile in self.tilemap.offgrid_at((mpos[0] + self.scroll[0], mpos[1] + self.scroll[1])):
+                self.tilemap.remove_offgrid(tile)
+                self.mark_dirty(self.tilemap.offgrid_rect(tile).move(-self.scroll[0], -self.scroll[1]).inflate(2, 2))
+
+    def render(self):
+        screen_rect = self.display.get_rect()
+        if self.dirty is None or not DIRTY_REDRAW:
+            area = screen_rect
+        elif self.dirty:
+            area = self.dirty[0].unionall(self.dirty[1:]).clip(screen_rect)
+        else:
+            return
+        self.dirty = []
+        if not area:
+            return
+
+        self.display.set_clip(area)
+        self.display.fill((0, 0, 0))
+
+        render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
+        self.tilemap.render(self.display, offset=render_scroll)
+
+        current_tile_img = self.assets[self.tile_list[self.tile_group]][self.tile_variant].copy()
+        current_tile_img.set_alpha(100)
+        if self.ongrid:
+            self.display.blit(current_tile_img, (self.tile_pos[0] * self.tilemap.tile_size - self.scroll[0],
+                                                 self.tile_pos[1] * self.tilemap.tile_size - self.scroll[1]))
+        else:
+            self.display.blit(current_tile_img, self.mpos)
+
+        self.display.blit(current_tile_img, (5, 5))
+        self.display.set_clip(None)
+
+        # only the repainted area is scaled up and pushed to the window
+        scale = self.screen.get_width() // self.display.get_width()
+        screen_area = pygame.Rect(area.x * scale, area.y * scale, area.w * scale, area.h * scale)
+        pygame.transform.scale(self.display.subsurface(area), screen_area.size, self.screen.subsurface(screen_area))
+        pygame.display.update(screen_area)
+
+    def run(self):
+        while True:
+            self.handle_events()
+            self.update()
+            self.render()
             self.clock.tick(60)
 
 
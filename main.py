@@ -1,70 +1,114 @@
+import os
 import time
 
 import pygame
 import sys
 import random
-import math
 
-from scripts.entities import Player, Ruhaan
-from scripts.tilemap import Tilemap
-from scripts.utils import Animation, load_image, load_images
+from scripts.entities import Player
+from scripts.tilemap import Tilemap, map_path
+from scripts.utils import load_animation, load_atlas, load_image, load_images
+from scripts.assets import Assets
+from scripts.audio import Sounds
 from scripts.stars import Stars
 from scripts.dust import Dusts
-from scripts.spark import Spark
+from scripts.spark import Sparks
+from scripts.profiler import Profiler
+from scripts.ruhaans import Ruhaans
+from scripts.streaming import LevelStreamer
+from scripts.replay import Recorder, Replay
 
 CRAZY_DEATH = False
 CRAZY_PARTICLE_AMOUNT = 100
 
+TICK_RATE = 60
+TICK_TIME = 1 / TICK_RATE
+MAX_FRAME_TIME = 0.25
+
+# binary levels can be streamed in around the camera instead of loaded whole
+STREAM_LEVELS = False
+STREAM_RADIUS = 2
+
+STARTUP_ASSETS = ['player/idle', 'player/run', 'player/jump', 'player/shoot', 'player/climb', 'ruhaan/idle', 'ruhaan/run',
+                  'stars', 'dust', 'cursor']
+
+SPARK_COLORS = [(230, 74, 34), (230, 74, 34), (230, 74, 34), (245, 155, 66), (245, 155, 66), (255, 255, 255)]
+DEATH_SPARK_COLORS = [(0, 0, 0), (50, 50, 50), (25, 25, 25)]
+
+# mixer channels reserved per group, a burst in one group never cuts off sounds in another
+# only groups with sounds get channels, the rest stay free for a bare Sound.play()
+SFX_CHANNELS = 16
+SFX_GROUPS = {'player': 4}
+
+# F3 toggles the profiler overlay, F4 exports the profile
+DEBUG_KEYS = {pygame.K_F3, pygame.K_F4}
+
+PROFILER_STAGES = ['idle', 'events', 'background', 'tilemap', 'enemies', 'player', 'particles', 'outline', 'present']
+
 
 class Game:
-    def __init__(self):
+    def __init__(self, headless=False, seed=None, level=0):
+        # every random stream in the simulation derives from this seed, so recorded input replays exactly
+        if seed is not None:
+            random.seed(seed)
+        if headless:
+            os.environ['SDL_VIDEODRIVER'] = 'dummy'
+            os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
         pygame.init()
         pygame.mouse.set_visible(False)
 
         pygame.display.set_caption('Risk of Lame')
         self.screen = pygame.display.set_mode((854, 480))
         self.outline_display = pygame.Surface((427, 240), pygame.SRCALPHA)
+        self.shadow_display = pygame.Surface((427, 240), pygame.SRCALPHA)
         self.display = pygame.Surface((427, 240))
+        # persistent targets so a steady-state frame doesn't create surfaces
+        self.scaled_display = pygame.Surface(self.screen.get_size())
+        self.transition_surf = pygame.Surface(self.display.get_size())
+        self.transition_surf.set_colorkey((255, 255, 255))
+
+        # decodes every image, as one cached atlas page, before any asset loads
+        load_atlas()
 
         self.clock = FPS()
+        self.profiler = Profiler(PROFILER_STAGES, budget=TICK_TIME)
+        self.show_profiler = False
 
         self.movement = [False, False]
         self.vertical_movement = [False, False]
 
-        self.colors = [
-            (230, 74, 34),
-            (230, 74, 34),
-            (230, 74, 34),
-
-            (245, 155, 66),
-            (245, 155, 66),
-
-            (255, 255, 255),
-        ]
-
-        self.assets = {
-            'default': load_images('tiles/default'),
-            'grass': load_images('tiles/grass'),
-            'pillar': load_images('tiles/pillar'),
-            'platform': load_images('tiles/platform'),
-            'rope': load_images('tiles/rope'),
-            'player/idle': Animation(load_images('entities/player/idle')),
-            'player/run': Animation(load_images('entities/player/run'), img_dur=5),
-            'player/jump': Animation(load_images('entities/player/jump')),
-            'player/shoot': Animation(load_images('entities/player/shoot'), img_dur=6),
-            'player/climb': Animation(load_images('entities/player/climb'), img_dur=10),
-            'ruhaan/idle': Animation(load_images('entities/ruhaan/idle')),
-            'ruhaan/run': Animation(load_images('entities/ruhaan/run'), img_dur=5),
-            'background': load_image('background.png'),
-            'stars': load_images('stars'),
-            'dust': load_images('dust'),
-            'cursor': load_image('cursor.png'),
-
-        }
-
-        self.sfx = {
-            'shoot': pygame.mixer.Sound('data/sfx/shoot.wav'),
-        }
+        # input as seen by the simulation, sampled once per frame or fed from a replay
+        self.mouse_pos = (0, 0)
+        self.recorder = None
+        self.replay = None
+        self.pending_events = []
+
+        self.colors = SPARK_COLORS
+        # render-only randomness, kept off the seeded streams so frame rate can't change the simulation
+        self.render_rng = random.Random()
+
+        self.assets = Assets()
+        for tile_type in ['default', 'grass', 'pillar', 'platform', 'rope']:
+            self.assets.add(tile_type, load_images, 'tiles/' + tile_type)
+        self.assets.add('player/idle', load_animation, 'entities/player/idle')
+        self.assets.add('player/run', load_animation, 'entities/player/run', img_dur=5)
+        self.assets.add('player/jump', load_animation, 'entities/player/jump')
+        self.assets.add('player/shoot', load_animation, 'entities/player/shoot', img_dur=6)
+        self.assets.add('player/climb', load_animation, 'entities/player/climb', img_dur=10)
+        self.assets.add('ruhaan/idle', load_animation, 'entities/Ruhaan/idle')
+        self.assets.add('ruhaan/run', load_animation, 'entities/Ruhaan/run', img_dur=5)
+        self.assets.add('background', load_image, 'background.png')
+        self.assets.add('stars', load_images, 'stars')
+        self.assets.add('dust', load_images, 'dust')
+        self.assets.add('cursor', load_image, 'cursor.png')
+        self.assets.preload(STARTUP_ASSETS)
+        self.assets.wait(STARTUP_ASSETS, self.screen)
+
+        self.sfx = Sounds(SFX_CHANNELS)
+        for group, count in SFX_GROUPS.items():
+            self.sfx.reserve(group, count)
+        self.sfx.add('shoot', 'data/sfx/shoot.wav', 'player', voices=2, priority=1, volume=1.0)
 
         self.cursor_img_rect = self.assets['cursor'].get_rect()
 
@@ -74,37 +118,50 @@ class Game:
         self.stars = Stars(self.assets['stars'], count=32)
         self.dust = Dusts(self.assets['dust'], count=32)
 
-        self.enemies = []
-        self.sparks = []
+        self.enemies = Ruhaans(self)
+        self.sparks = Sparks()
+        self.streamer = None
 
         self.scroll = [0, 0]
+        self.prev_scroll = [0, 0]
         self.dead = 0
-        self.level = 0
+        self.level = level
 
         self.load_level(self.level)
         self.screenshake = 0
         self.near_rope = False
         self.on_rope = False
+        self.current_rope = None
 
         self.scroll[0] += self.player.rect().centerx - self.display.get_width() / 2
         self.scroll[1] += self.player.rect().centery - self.display.get_height() / 2
+        self.prev_scroll = self.scroll.copy()
 
         self.fps = 60
 
     def load_level(self, map_id):
-        self.tilemap.load('data/maps/' + str(map_id) + '.json')
-
-        # self.leaf_spawners = []
-        # for tree in self.tilemap.extract([('large_decor', 2)], keep=True):
-        #     self.leaf_spawners.append(pygame.Rect(4 + tree['pos'][0], 4 + tree['pos'][1], 23, 13))
-
-        self.enemies = []
-        for spawner in self.tilemap.extract([('spawners', 0), ('spawners', 1)]):
-            if spawner['variant'] == 0:
-                self.player.pos = spawner['pos']
-                self.player.air_time = 0
-            else:
-                self.enemies.append(Ruhaan(self, spawner['pos'], (16, 16)))
+        if self.streamer:
+            self.streamer.close()
+            self.streamer = None
+
+        self.enemies.clear()
+        path = map_path('data/maps/' + str(map_id))
+        if STREAM_LEVELS and path.endswith('.map'):
+            self.load_streamed(path)
+        else:
+            self.tilemap.load(path)
+
+            # self.leaf_spawners = []
+            # for tree in self.tilemap.extract([('large_decor', 2)], keep=True):
+            #     self.leaf_spawners.append(pygame.Rect(4 + tree['pos'][0], 4 + tree['pos'][1], 23, 13))
+
+            for spawner in self.tilemap.extract([('spawners', 0), ('spawners', 1)]):
+                if spawner['variant'] == 0:
+                    self.player.pos = spawner['pos']
+                    self.player.prev_pos = self.player.pos.copy()
+                    self.player.air_time = 0
+                else:
+                    self.enemies.add(spawner['pos'])
 
         # for spawner in self.tilemap.extract([('spawners', 0), ('spawners', 1)]):
         #     if spawner['variant'] == 0:
@@ -114,173 +171,328 @@ class Game:
         self.transition = 0
         self.dead = 0
 
-    def run(self):
-        while True:
-            self.near_rope = False
-            self.outline_display.fill((0, 0, 0, 0))
-            # self.display.blit(self.assets['background'], (0, 0))
-            self.display.fill((35, 39, 42))
-
-            if self.dead == 1:
-                for i in range(100):
-                    angle = random.random() * math.pi * 2
-                    speed = random.random() * 10
-                    self.sparks.append(Spark(self.player.rect().center, angle, speed))
-
-            if self.dead:
-                if CRAZY_DEATH:
-                    for i in range(CRAZY_PARTICLE_AMOUNT):
-                        angle = random.random() * math.pi * 2
-                        speed = random.random() * 10
-                        self.sparks.append(Spark(self.player.rect().center, angle, speed))
-                self.dead += 1
-                if self.dead >= 10:
-                    self.transition = min(100, self.transition + 1)
-                if self.dead > 100:
-                    self.load_level(self.level)
-
-            self.screenshake = max(0, self.screenshake - 1)
-
-            self.scroll[0] += (self.player.rect().centerx - self.display.get_width() / 2 - self.scroll[0]) / 30
-            self.scroll[1] += (self.player.rect().centery - self.display.get_height() / 2 - self.scroll[1]) / 30
-            render_scroll = (int(self.scroll[0]), int(self.scroll[1]))
-
-            self.stars.update()
-            self.stars.render(self.display, offset=render_scroll)
-            self.dust.update()
-            self.dust.render(self.display, offset=render_scroll)
-
-            self.tilemap.render(self.outline_display, offset=render_scroll)
-
-            for enemy in self.enemies.copy():
-                kill = enemy.update(self.tilemap, (0, 0))
-                enemy.render(self.outline_display, offset=render_scroll)
-                if kill:
-                    self.enemies.remove(enemy)
-
-            if not self.dead:
-                self.player.update(
-                    self.tilemap,
-                    ((self.movement[1] - self.movement[0]) if not self.on_rope else 0,
-                     (self.vertical_movement[1] - self.vertical_movement[0]))
-                )
-
-                self.player.render(self.outline_display, offset=render_scroll)
-
-                # if self.player.is_shooting():
-                #     self.player.render_hitbox(self.display, offset=render_scroll)
-
-                signals, self.current_rope = self.player.signal_manager()
-
-                for signal in signals:
-                    match signal:
-                        case "on_rope":
-                            self.near_rope = True
-
-                for enemy in self.enemies:
-                    if self.player.rect().colliderect(enemy.rect()):
-                        self.screenshake = max(64, self.screenshake)
-                        self.dead = 1
-
-            for spark in self.sparks.copy():
-                kill = spark.update()
-                if self.dead:
-                    self.colors = [(0, 0, 0), (50, 50, 50), (25, 25, 25)]
-                else:
-                    self.colors = [(230, 74, 34), (230, 74, 34), (230, 74, 34), (245, 155, 66), (245, 155, 66), (255, 255, 255)]
-                spark.render(self.outline_display, random.choice(self.colors), offset=render_scroll)
-                if kill:
-                    self.sparks.remove(spark)
-
-            display_mask = pygame.mask.from_surface(self.outline_display)
-            display_sillhoutte = display_mask.to_surface(setcolor=(0, 0, 0, 50), unsetcolor=(0, 0, 0, 0))
-            for offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                self.display.blit(display_sillhoutte, offset)
-
-            if not self.near_rope:
-                self.on_rope = False
-                self.vertical_movement = [False, False]
-
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    if event.button == 1:
-                        self.player.set_action_input(True)
-
-                if event.type == pygame.MOUSEBUTTONUP:
-                    if event.button == 1:
-                        self.player.set_action_input(False)
-
-                if event.type == pygame.KEYDOWN:
-                    if self.near_rope and event.key == pygame.K_w:
-                        self.player.disable_gravity()
-                        self.player.pos[0] = self.current_rope['pos'][0] * 16 + 4
-                        self.on_rope = True
-
-                    if event.key == pygame.K_SPACE:
-                        if self.player.jump():
-                            self.on_rope = False
-                            # self.sfx['jump'].play()
-
-                    if event.key == pygame.K_a:
-                        self.movement[0] = True
-                    if event.key == pygame.K_d:
-                        self.movement[1] = True
-                    if self.on_rope:
-                        if event.key == pygame.K_w:
-                            self.vertical_movement[0] = True
-                        if event.key == pygame.K_s:
-                            self.vertical_movement[1] = True
-
-                if event.type == pygame.KEYUP:
-                    if event.key == pygame.K_a:
-                        self.movement[0] = False
-                    if event.key == pygame.K_d:
-                        self.movement[1] = False
-
+    def load_streamed(self, path):
+        # spawners are handled by the streamer as their regions come in
+        self.streamer = LevelStreamer(self, path, radius=STREAM_RADIUS)
+        spawn = self.streamer.find_player_spawn()
+        if spawn:
+            self.player.pos = spawn
+            self.player.prev_pos = self.player.pos.copy()
+            self.player.air_time = 0
+        self.streamer.load_around(self.player.rect().center)
+
+    def handle_events(self, events):
+        for event in events:
+            if event.type == pygame.QUIT:
+                self.quit()
+
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button == 1:
+                    self.player.set_action_input(True)
+
+            if event.type == pygame.MOUSEBUTTONUP:
+                if event.button == 1:
+                    self.player.set_action_input(False)
+
+            if event.type == pygame.KEYDOWN:
+                if self.near_rope and event.key == pygame.K_w:
+                    self.player.disable_gravity()
+                    self.player.pos[0] = self.current_rope['pos'][0] * 16 + 4
+                    self.on_rope = True
+
+                if event.key == pygame.K_SPACE:
+                    if self.player.jump():
+                        self.on_rope = False
+                        # self.sfx.play('jump')
+
+                if event.key == pygame.K_a:
+                    self.movement[0] = True
+                if event.key == pygame.K_d:
+                    self.movement[1] = True
+                if self.on_rope:
                     if event.key == pygame.K_w:
-                        self.vertical_movement[0] = False
+                        self.vertical_movement[0] = True
                     if event.key == pygame.K_s:
-                        self.vertical_movement[1] = False
-
-            screenshake_offset = (random.random() * self.screenshake - self.screenshake / 2,
-                                  random.random() * self.screenshake - self.screenshake / 2)
-
-            if self.transition:
-                transition_surf = pygame.Surface(self.display.get_size())
-                transition_surf.fill((255, 255, 255))
-                pygame.draw.circle(transition_surf, (0, 0, 0),
-                                   (self.player.rect().centerx - render_scroll[0], self.player.rect().centery - render_scroll[1]),
-                                   (abs(self.transition) + 20) * 3)
-                pygame.draw.circle(transition_surf, (255, 255, 255),
-                                   (self.player.rect().centerx - render_scroll[0], self.player.rect().centery - render_scroll[1]),
-                                   (abs(self.transition)) * 4)
-                transition_surf.set_colorkey((255, 255, 255))
-                self.outline_display.blit(transition_surf, (0, 0))
-
-            self.display.blit(self.outline_display, (0, 0))
-            self.screen.blit(pygame.transform.scale(self.display, self.screen.get_size()), screenshake_offset)
+                        self.vertical_movement[1] = True
+
+            if event.type == pygame.KEYUP:
+                if event.key == pygame.K_a:
+                    self.movement[0] = False
+                if event.key == pygame.K_d:
+                    self.movement[1] = False
+
+                if event.key == pygame.K_w:
+                    self.vertical_movement[0] = False
+                if event.key == pygame.K_s:
+                    self.vertical_movement[1] = False
+
+    def handle_debug_keys(self, events):
+        # debug keys act on the window rather than the simulation, so they never reach a recording or a replay
+        for event in events:
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_F3:
+                    self.show_profiler = not self.show_profiler
+                if event.key == pygame.K_F4:
+                    self.profiler.export_csv('profile.csv')
+                    self.profiler.export_trace('profile_trace.json')
+        return [event for event in events if event.type not in {pygame.KEYDOWN, pygame.KEYUP}
+                or event.key not in DEBUG_KEYS]
+
+    def step(self):
+        self.near_rope = False
+        self.prev_scroll = self.scroll.copy()
+
+        if self.dead == 1:
+            self.sparks.random_burst(self.player.rect().center, 100, max_speed=10)
+
+        if self.dead:
+            if CRAZY_DEATH:
+                self.sparks.random_burst(self.player.rect().center, CRAZY_PARTICLE_AMOUNT, max_speed=10)
+            self.dead += 1
+            if self.dead >= 10:
+                self.transition = min(100, self.transition + 1)
+            if self.dead > 100:
+                self.load_level(self.level)
+
+        self.screenshake = max(0, self.screenshake - 1)
+
+        self.scroll[0] += (self.player.rect().centerx - self.display.get_width() / 2 - self.scroll[0]) / 30
+        self.scroll[1] += (self.player.rect().centery - self.display.get_height() / 2 - self.scroll[1]) / 30
+
+        if self.streamer:
+            self.streamer.update((self.scroll[0] + self.display.get_width() / 2,
+                                  self.scroll[1] + self.display.get_height() / 2))
+
+        self.profiler.start('background')
+        self.stars.update()
+        self.dust.update()
+        self.profiler.stop('background')
+
+        self.profiler.start('enemies')
+        self.enemies.update(self.tilemap)
+
+        if self.player.is_shooting():
+            self.enemies.hit(self.enemies.collide(self.player.gun.rect()))
+        self.profiler.stop('enemies')
+
+        self.profiler.start('player')
+        if not self.dead:
+            self.player.update(
+                self.tilemap,
+                ((self.movement[1] - self.movement[0]) if not self.on_rope else 0,
+                 (self.vertical_movement[1] - self.vertical_movement[0]))
+            )
+
+            signals, self.current_rope = self.player.signal_manager()
+
+            for signal in signals:
+                match signal:
+                    case "on_rope":
+                        self.near_rope = True
+
+            if len(self.enemies.collide(self.player.rect())):
+                self.screenshake = max(64, self.screenshake)
+                self.dead = 1
+        self.profiler.stop('player')
+
+        self.profiler.start('particles')
+        self.sparks.update()
+        self.profiler.stop('particles')
+
+        if not self.near_rope:
+            self.on_rope = False
+            self.vertical_movement = [False, False]
+
+    def render(self, alpha=1.0):
+        self.outline_display.fill((0, 0, 0, 0))
+        self.shadow_display.fill((0, 0, 0, 0))
+        # self.display.blit(self.assets['background'], (0, 0))
+        self.display.fill((35, 39, 42))
+
+        render_scroll = (int(self.scroll[0] - (self.scroll[0] - self.prev_scroll[0]) * (1 - alpha)),
+                         int(self.scroll[1] - (self.scroll[1] - self.prev_scroll[1]) * (1 - alpha)))
+
+        self.profiler.start('background')
+        self.stars.render(self.display, offset=render_scroll)
+        self.dust.render(self.display, offset=render_scroll)
+        self.profiler.stop('background')
+
+        self.profiler.start('tilemap')
+        self.tilemap.render(self.outline_display, offset=render_scroll, shadow=self.shadow_display)
+        self.profiler.stop('tilemap')
+
+        self.profiler.start('enemies')
+        self.enemies.render(self.outline_display, offset=render_scroll, shadow=self.shadow_display, alpha=alpha)
+        self.profiler.stop('enemies')
+
+        self.profiler.start('player')
+        if not self.dead:
+            self.player.render(self.outline_display, offset=render_scroll, shadow=self.shadow_display, alpha=alpha)
+
+            # if self.player.is_shooting():
+            #     self.player.render_hitbox(self.display, offset=render_scroll)
+        self.profiler.stop('player')
+
+        self.profiler.start('particles')
+        self.colors = DEATH_SPARK_COLORS if self.dead else SPARK_COLORS
+        self.sparks.render(self.outline_display, self.colors, offset=render_scroll, shadow=self.shadow_display)
+        self.profiler.stop('particles')
+
+        self.profiler.start('outline')
+        # every sprite drew its cached silhouette into shadow_display, so no full-screen mask pass is needed
+        for offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+            self.display.blit(self.shadow_display, offset)
+        self.profiler.stop('outline')
+
+        self.profiler.start('present')
+        screenshake_offset = (self.render_rng.random() * self.screenshake - self.screenshake / 2,
+                              self.render_rng.random() * self.screenshake - self.screenshake / 2)
+
+        if self.transition:
+            center = self.player.rect().centerx - render_scroll[0], self.player.rect().centery - render_scroll[1]
+            self.transition_surf.fill((255, 255, 255))
+            pygame.draw.circle(self.transition_surf, (0, 0, 0), center, (abs(self.transition) + 20) * 3)
+            pygame.draw.circle(self.transition_surf, (255, 255, 255), center, (abs(self.transition)) * 4)
+            self.outline_display.blit(self.transition_surf, (0, 0))
+
+        self.display.blit(self.outline_display, (0, 0))
+        if self.screenshake:
+            pygame.transform.scale(self.display, self.screen.get_size(), self.scaled_display)
+            self.screen.blit(self.scaled_display, screenshake_offset)
+        else:
+            # nothing to offset, so scale straight into the window
+            pygame.transform.scale(self.display, self.screen.get_size(), self.screen)
+
+        self.cursor_img_rect.center = self.mouse_pos
+        self.screen.blit(self.assets['cursor'], self.cursor_img_rect)
+        self.clock.render(self.screen)
+        if self.show_profiler:
+            self.profiler.render(self.screen, self.clock.small_font)
+
+        pygame.display.update()
+        self.profiler.stop('present')
+
+    def tick(self):
+        # input is applied to the tick it was collected before, which is also what gets recorded
+        if self.replay:
+            frame = self.replay.next_tick()
+            if frame is None:
+                return False
+            self.mouse_pos, events = frame
+            self.handle_events(events)
+        elif self.recorder:
+            self.recorder.record(self.mouse_pos, self.pending_events)
+            self.pending_events = []
+        self.step()
+        return True
+
+    def simulate(self, ticks=None, render=False):
+        # runs the simulation as fast as possible, used for headless soak tests and replays
+        count = 0
+        while ticks is None or count < ticks:
+            self.profiler.begin_frame()
+            if not self.tick():
+                break
+            if render:
+                self.render()
+            count += 1
+        return count
+
+    def quit(self):
+        if self.recorder:
+            self.recorder.close()
+        pygame.quit()
+        sys.exit()
 
-            self.cursor_img_rect.center = pygame.mouse.get_pos()
-            self.screen.blit(self.assets['cursor'], self.cursor_img_rect)
-            self.clock.render(self.screen)
+    def run(self):
+        accumulator = 0
+        while True:
+            self.profiler.begin_frame()
+
+            # clamp long frames so a stall doesn't turn into a burst of catch-up ticks
+            self.profiler.start('idle')
+            accumulator += min(self.clock.clock.tick(self.fps) / 1000, MAX_FRAME_TIME)
+            self.profiler.stop('idle')
+
+            self.profiler.start('events')
+            events = self.handle_debug_keys(pygame.event.get())
+            if self.replay:
+                # a replay only listens for the window closing, its input comes from the recording
+                if any(event.type == pygame.QUIT for event in events):
+                    self.quit()
+            else:
+                self.mouse_pos = pygame.mouse.get_pos()
+                self.handle_events(events)
+                if self.recorder:
+                    self.pending_events += events
+            self.profiler.stop('events')
+            while accumulator >= TICK_TIME:
+                if not self.tick():
+                    self.quit()
+                accumulator -= TICK_TIME
 
-            pygame.display.update()
-            self.clock.clock.tick(self.fps)
+            self.render(accumulator / TICK_TIME)
 
 
 class FPS:
     def __init__(self):
         self.clock = pygame.time.Clock()
         self.font = pygame.font.Font("data/font.ttf", 34)
+        self.small_font = pygame.font.Font("data/font.ttf", 12)
+        self.value = None
         self.text = self.font.render(str(self.clock.get_fps()), True, (0, 0, 0, 100))
 
     def render(self, display):
-        self.text = self.font.render(str(int(self.clock.get_fps())), False, (255, 255, 255, 100))
+        # the text only changes when the rounded fps does
+        value = int(self.clock.get_fps())
+        if value != self.value:
+            self.value = value
+            self.text = self.font.render(str(value), False, (255, 255, 255, 100))
         display.blit(self.text, (10, 5))
 
 
-Game().run()
+def summary(game):
+    # end state of a run, two replays of the same recording should print the same line
+    enemies = game.enemies.pos[:len(game.enemies)].sum(axis=0).tolist() if len(game.enemies) else [0, 0]
+    return (f'player {game.player.pos[0]:.2f},{game.player.pos[1]:.2f} enemies {len(game.enemies)} '
+            f'at {enemies[0]:.2f},{enemies[1]:.2f} sparks {len(game.sparks)}')
+
+
+if __name__ == '__main__':
+    # python main.py [--headless [ticks]] [--alloc] [--record file | --replay file]
+    args = sys.argv[1:]
+    replay = Replay(args[args.index('--replay') + 1]) if '--replay' in args else None
+    record = args[args.index('--record') + 1] if '--record' in args else None
+    seed = replay.seed if replay else (random.getrandbits(32) if record else None)
+    # a replay starts on the level it was recorded on
+    level = replay.level if replay else 0
+
+    if '--headless' in args:
+        i = args.index('--headless') + 1
+        ticks = int(args[i]) if i < len(args) and args[i].isdigit() else (None if replay else 3600)
+        game = Game(headless=True, seed=seed, level=level)
+        game.replay = replay
+        if '--alloc' in args:
+            # renders every tick too, so the whole loop is measured
+            game.profiler = Profiler(PROFILER_STAGES, budget=TICK_TIME, track_allocations=True)
+            game.simulate(ticks, render=True)
+            mean, peak = game.profiler.heap_peak_stats()
+            print(f'last {game.profiler.count - 1} ticks raised the heap by {mean:.0f} B/tick on average, {peak} B at '
+                  f'most, outside the exempt sprite batches')
+            mean, peak = game.profiler.heap_peak_stats(hot=True)
+            print(f'allocation_free hot paths raised it by {mean:.0f} B/tick on average, {peak} B at most')
+            # the hot paths allocate nothing once warmed up, anything else is a regression
+            sys.exit(1 if peak else 0)
+        else:
+            start = time.perf_counter()
+            ticks = game.simulate(ticks)
+            elapsed = time.perf_counter() - start
+            print(f'{ticks} ticks in {elapsed:.3f}s ({ticks / elapsed:.0f} ticks/s)')
+            if replay:
+                print(summary(game))
+    else:
+        game = Game(seed=seed, level=level)
+        game.replay = replay
+        if record:
+            game.recorder = Recorder(record, seed, game.level)
+        game.run()
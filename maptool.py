@@ -0,0 +1,148 @@
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from scripts.tilemap import Tilemap, map_path, NEIGHBOR_OFFSETS
+
+# python maptool.py <command> [--jobs N] [map.json|map.map|directory ...]
+#   convert   write the other format next to each map (json <-> map)
+#   autotile  autotile each map and save it in place, in every format it exists in
+#   validate  check spawners, tile types, variants and orphaned tiles
+#   bake      write the binary .map load cache for each map and refresh the image atlas
+
+COMMANDS = ['convert', 'autotile', 'validate', 'bake']
+TILE_IMG_PATH = 'data/images/tiles/'
+
+
+def convert(path):
+    tilemap = Tilemap(None)
+    tilemap.load(path)
+    out = os.path.splitext(path)[0] + ('.json' if path.endswith('.map') else '.map')
+    tilemap.save(out, source=path if path.endswith('.json') else None)
+    return out
+
+
+def autotile(path):
+    tilemap = Tilemap(None)
+    tilemap.load(path)
+    before = {(tuple(tile['pos']), tile['variant']) for tile in tilemap.tiles()}
+    tilemap.autotile()
+    changed = len(before - {(tuple(tile['pos']), tile['variant']) for tile in tilemap.tiles()})
+    # keep the other format in step so map_path doesn't pick a stale copy
+    base = os.path.splitext(path)[0]
+    for out in [base + '.json', base + '.map']:
+        if out == path or os.path.exists(out):
+            tilemap.save(out, source=base + '.json' if os.path.exists(base + '.json') else None)
+    return f'{changed} tiles changed'
+
+
+def variant_counts():
+    # number of images per tile type, read from the directory listing so nothing gets decoded
+    return {tile_type: len(os.listdir(TILE_IMG_PATH + tile_type)) for tile_type in os.listdir(TILE_IMG_PATH)}
+
+
+def validate(path):
+    tilemap = Tilemap(None)
+    tilemap.load(path)
+    counts = variant_counts()
+    problems = []
+
+    players = tilemap.extract([('spawners', 0)], keep=True)
+    if len(players) != 1:
+        problems.append(f'{len(players)} player spawners, expected 1')
+
+    tiles = list(tilemap.tiles()) + list(tilemap.offgrid_tiles.values())
+    for tile in tiles:
+        if tile['type'] not in counts:
+            problems.append(f'unknown tile type {tile["type"]} at {tile["pos"]}')
+        elif tile['variant'] >= counts[tile['type']]:
+            problems.append(f'{tile["type"]} variant {tile["variant"]} at {tile["pos"]} has no image')
+
+    # a grid tile with nothing around it is usually a stray click in the editor
+    for tile in tilemap.tiles():
+        x, y = tile['pos']
+        if tile['type'] != 'spawners' and not any(tilemap.get_id(x + dx, y + dy)
+                                                  for dx, dy in NEIGHBOR_OFFSETS if (dx, dy) != (0, 0)):
+            problems.append(f'orphaned {tile["type"]} tile at {tile["pos"]}')
+
+    return problems
+
+
+def bake(path):
+    return convert(path) if path.endswith('.json') else path
+
+
+def run(task):
+    # runs in a worker process, so failures come back as text instead of killing the pool
+    command, path = task
+    try:
+        if command == 'convert':
+            out = convert(path)
+            return True, f'{path} ({os.path.getsize(path)} bytes) -> {out} ({os.path.getsize(out)} bytes)'
+        if command == 'autotile':
+            return True, f'{path}: {autotile(path)}'
+        if command == 'validate':
+            problems = validate(path)
+            return not problems, f'{path}: ' + ('ok' if not problems else '\n  '.join([''] + problems))
+        if command == 'bake':
+            return True, f'{path} -> {bake(path)}'
+    except Exception as e:
+        return False, f'{path}: {type(e).__name__}: {e}'
+
+
+def map_files(paths, command):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            bases = sorted({os.path.splitext(name)[0] for name in glob.glob(os.path.join(path, '*.json'))
+                            + glob.glob(os.path.join(path, '*.map'))})
+            if command in {'convert', 'bake'}:
+                # directories convert from json, the editor's source format
+                files += [base + '.json' for base in bases if os.path.exists(base + '.json')]
+            else:
+                files += [map_path(base) for base in bases]
+        else:
+            files.append(path)
+    return files
+
+
+def bake_atlas():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    from scripts.utils import load_atlas
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    load_atlas()
+    pygame.quit()
+
+
+def main(args):
+    if not args or args[0] not in COMMANDS:
+        sys.exit(f'usage: python maptool.py {{{",".join(COMMANDS)}}} [--jobs N] [map.json|map.map|directory ...]')
+    command = args.pop(0)
+    jobs = os.cpu_count()
+    paths = []
+    while args:
+        arg = args.pop(0)
+        if arg == '--jobs':
+            jobs = int(args.pop(0))
+        else:
+            paths.append(arg)
+
+    files = map_files(paths or ['data/maps'], command)
+    ok = True
+    with ProcessPoolExecutor(max_workers=max(1, min(jobs, len(files)))) as pool:
+        for success, message in pool.map(run, [(command, path) for path in files]):
+            print(message)
+            ok = ok and success
+    if command == 'bake':
+        bake_atlas()
+        print('image atlas up to date')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+
+class Assets:
+    # dict-like asset store, each entry is built by its loader on first access or ahead of time in the background
+    # images come out of the atlas, decoded before this runs, so loaders only build flips and silhouettes from it
+    # that work holds the GIL, one worker keeps the window responsive and more wouldn't finish any sooner
+    def __init__(self, workers=1):
+        self.loaders = {}
+        self.loaded = {}
+        self.futures = {}
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='assets')
+
+    def add(self, key, loader, *args, **kwargs):
+        self.loaders[key] = (loader, args, kwargs)
+
+    def load(self, key):
+        loader, args, kwargs = self.loaders[key]
+        return loader(*args, **kwargs)
+
+    def preload(self, keys=None):
+        for key in self.loaders if keys is None else keys:
+            if key not in self.loaded and key not in self.futures:
+                self.futures[key] = self.pool.submit(self.load, key)
+
+    def __getitem__(self, key):
+        if key not in self.loaded:
+            future = self.futures.pop(key, None)
+            self.loaded[key] = future.result() if future else self.load(key)
+        return self.loaded[key]
+
+    def __contains__(self, key):
+        return key in self.loaders
+
+    def __iter__(self):
+        return iter(self.loaders)
+
+    def __len__(self):
+        return len(self.loaders)
+
+    def pending(self, keys=None):
+        return [key for key in (self.futures if keys is None else keys)
+                if key in self.futures and not self.futures[key].done()]
+
+    def progress(self, keys=None):
+        keys = list(self.loaders if keys is None else keys)
+        if not keys:
+            return 1.0
+        return 1 - len(self.pending(keys)) / len(keys)
+
+    def wait(self, keys, surf=None, color=(255, 255, 255)):
+        # blocks until keys are loaded, drawing a progress bar on surf so the window isn't frozen meanwhile
+        while self.pending(keys):
+            if surf:
+                pygame.event.pump()
+                surf.fill((0, 0, 0))
+                bar = pygame.Rect(surf.get_width() // 4, surf.get_height() // 2 - 4, surf.get_width() // 2, 8)
+                pygame.draw.rect(surf, color, bar, 1)
+                pygame.draw.rect(surf, color, (bar.x, bar.y, int(bar.width * self.progress(keys)), bar.height))
+                pygame.display.update()
+            pygame.time.wait(5)
+        for key in keys:
+            self[key]
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
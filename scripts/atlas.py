@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+
+import pygame
+
+ATLAS_WIDTH = 512
+PADDING = 1
+
+
+def image_files(base):
+    # every image under base as a path relative to it, with '/' separators so the index is portable
+    files = []
+    for root, dirs, names in os.walk(base):
+        for name in names:
+            if name.endswith('.png'):
+                files.append(os.path.relpath(os.path.join(root, name), base).replace(os.sep, '/'))
+    return sorted(files)
+
+
+def signature(base, files):
+    # stat only, so checking the cache doesn't open or decode any image
+    digest = hashlib.sha1()
+    for path in files:
+        stat = os.stat(base + path)
+        digest.update(f'{path}:{stat.st_mtime_ns}:{stat.st_size};'.encode())
+    return digest.hexdigest()
+
+
+def pack(sizes, width=ATLAS_WIDTH):
+    # shelf packing, tallest images first so rows waste as little height as possible
+    rects = {}
+    x = y = row_height = 0
+    for path, (w, h) in sorted(sizes.items(), key=lambda item: (-item[1][1], item[0])):
+        if x + w > width:
+            x = 0
+            y += row_height + PADDING
+            row_height = 0
+        rects[path] = (x, y, w, h)
+        x += w + PADDING
+        row_height = max(row_height, h)
+    return rects, y + row_height
+
+
+class Atlas:
+    def __init__(self, surf, rects):
+        self.surf = surf
+        self.rects = rects
+        self.dirs = {}
+        for path in rects:
+            self.dirs.setdefault(os.path.dirname(path), []).append(path)
+        for paths in self.dirs.values():
+            paths.sort()
+
+    def __contains__(self, path):
+        return path in self.rects
+
+    def image(self, path):
+        # subsurfaces share the atlas pixels and inherit its colorkey
+        return self.surf.subsurface(self.rects[path])
+
+    def images(self, directory):
+        return [self.image(path) for path in self.dirs.get(directory, [])]
+
+    @staticmethod
+    def bake(base, files):
+        images = {path: pygame.image.load(base + path).convert() for path in files}
+        rects, height = pack({path: img.get_size() for path, img in images.items()})
+        surf = pygame.Surface((ATLAS_WIDTH, max(1, height))).convert()
+        surf.fill((255, 0, 255))
+        for path, img in images.items():
+            surf.blit(img, rects[path][:2])
+        return surf, rects
+
+    @classmethod
+    def load(cls, base, cache_dir):
+        files = image_files(base)
+        sig = signature(base, files)
+        index_path = os.path.join(cache_dir, 'atlas.json')
+        image_path = os.path.join(cache_dir, 'atlas.png')
+
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+            if index['signature'] == sig:
+                surf = pygame.image.load(image_path).convert()
+                surf.set_colorkey((255, 0, 255))
+                return cls(surf, {path: tuple(rect) for path, rect in index['rects'].items()})
+        except (OSError, ValueError, KeyError, pygame.error):
+            pass
+
+        surf, rects = cls.bake(base, files)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            pygame.image.save(surf, image_path)
+            with open(index_path, 'w') as f:
+                json.dump({'signature': sig, 'width': ATLAS_WIDTH, 'rects': rects}, f)
+        except (OSError, pygame.error):
+            # a read-only install still gets the packed atlas for this run
+            pass
+        surf.set_colorkey((255, 0, 255))
+        return cls(surf, rects)
@@ -0,0 +1,79 @@
+import pygame
+
+
+class Sounds:
+    # sfx store that plays each sound on its own group of reserved mixer channels, with a cap on overlapping voices
+    def __init__(self, channels=16):
+        self.enabled = pygame.mixer.get_init() is not None
+        if self.enabled:
+            pygame.mixer.set_num_channels(channels)
+        self.reserved = 0
+        self.groups = {}
+        self.sounds = {}
+        self.cache = {}
+        # channel index -> (sound name, priority, play order) for whatever it was last asked to play
+        self.voices = {}
+        self.plays = 0
+
+    def reserve(self, group, count):
+        # reserved channels are never picked by a bare Sound.play(), so groups can't starve each other
+        self.groups[group] = list(range(self.reserved, self.reserved + count))
+        self.reserved += count
+        if self.enabled:
+            pygame.mixer.set_reserved(self.reserved)
+
+    def load(self, path):
+        if path not in self.cache:
+            self.cache[path] = pygame.mixer.Sound(path) if self.enabled else None
+        return self.cache[path]
+
+    def add(self, name, path, group, voices=1, priority=0, volume=1.0):
+        sound = self.load(path)
+        if sound:
+            sound.set_volume(volume)
+        self.sounds[name] = (sound, group, voices, priority)
+
+    def __contains__(self, name):
+        return name in self.sounds
+
+    def playing(self, name=None):
+        # voices still audible, pruning the ones the mixer has finished with
+        for i in list(self.voices):
+            if not pygame.mixer.Channel(i).get_busy():
+                del self.voices[i]
+        return [i for i, voice in self.voices.items() if name is None or voice[0] == name]
+
+    def channel_for(self, name, group, voices, priority):
+        channels = self.groups[group]
+        playing = self.playing()
+        own = [i for i in channels if i in playing and self.voices[i][0] == name]
+        if len(own) >= voices:
+            # at the cap the oldest voice of the same sound is restarted instead of stacking another
+            return min(own, key=lambda i: self.voices[i][2])
+        for i in channels:
+            if i not in playing:
+                return i
+        # group is full, steal the oldest voice with the lowest priority no higher than ours
+        victims = [i for i in channels if self.voices[i][1] <= priority]
+        if victims:
+            return min(victims, key=lambda i: self.voices[i][1:])
+        return None
+
+    def play(self, name):
+        sound, group, voices, priority = self.sounds[name]
+        if not sound:
+            return None
+        i = self.channel_for(name, group, voices, priority)
+        if i is None:
+            return None
+        channel = pygame.mixer.Channel(i)
+        channel.play(sound)
+        self.plays += 1
+        self.voices[i] = (name, priority, self.plays)
+        return channel
+
+    def stop(self, group=None):
+        for i in list(self.voices):
+            if group is None or i in self.groups[group]:
+                pygame.mixer.Channel(i).stop()
+                del self.voices[i]
@@ -1,15 +1,16 @@
-import math
-import random
 import pygame
 from scripts.weapon import Weapon
-from scripts.spark import Spark
 
 class PhysicsEntity:
     def __init__(self, game, e_type, pos, size):
         self.game = game
         self.type = e_type
         self.pos = list(pos)
+        # position at the start of the last tick, used to interpolate rendering between ticks
+        self.prev_pos = list(pos)
         self.size = size
+        # rect() refreshes this in place instead of building a new Rect every call
+        self.hitbox = pygame.Rect(0, 0, size[0], size[1])
         self.velocity = [0, 0]
         self.collisions = {'up': False, 'down': False, 'right': False, 'left': False}
 
@@ -21,7 +22,8 @@ class PhysicsEntity:
         self.last_movement = [0, 0]
 
     def rect(self):
-        return pygame.Rect(self.pos[0], self.pos[1], self.size[0], self.size[1])
+        self.hitbox.update(self.pos[0], self.pos[1], self.size[0], self.size[1])
+        return self.hitbox
 
     def set_action(self, action):
         if action != self.action:
@@ -30,32 +32,26 @@ class PhysicsEntity:
 
     def update(self, tilemap, movement=(0, 0)):
         self.collisions = {'up': False, 'down': False, 'right': False, 'left': False}
+        self.prev_pos = self.pos.copy()
 
         frame_movement = (movement[0] + self.velocity[0], movement[1] + self.velocity[1])
 
-        self.pos[0] += frame_movement[0]
-        entity_rect = self.rect()
-        for rect in tilemap.physics_rects_around(self.pos):
-            if entity_rect.colliderect(rect):
-                if frame_movement[0] > 0:
-                    entity_rect.right = rect.left
-                    self.collisions['right'] = True
-                if frame_movement[0] < 0:
-                    entity_rect.left = rect.right
-                    self.collisions['left'] = True
-                self.pos[0] = entity_rect.x
-
-        self.pos[1] += frame_movement[1]
-        entity_rect = self.rect()
-        for rect in tilemap.physics_rects_around(self.pos):
-            if entity_rect.colliderect(rect):
-                if frame_movement[1] > 0:
-                    entity_rect.bottom = rect.top
-                    self.collisions['down'] = True
-                if frame_movement[1] < 0:
-                    entity_rect.top = rect.bottom
-                    self.collisions['up'] = True
-                self.pos[1] = entity_rect.y
+        # each axis sweeps from where the hitbox was, so moves longer than a tile can't pass through walls
+        if frame_movement[0]:
+            entity_rect = self.rect()
+            self.pos[0] += frame_movement[0]
+            x, hit = tilemap.sweep(entity_rect, 0, int(self.pos[0]))
+            if hit:
+                self.pos[0] = x
+                self.collisions['right' if frame_movement[0] > 0 else 'left'] = True
+
+        if frame_movement[1]:
+            entity_rect = self.rect()
+            self.pos[1] += frame_movement[1]
+            y, hit = tilemap.sweep(entity_rect, 1, int(self.pos[1]))
+            if hit:
+                self.pos[1] = y
+                self.collisions['down' if frame_movement[1] > 0 else 'up'] = True
 
         if movement[0] > 0:
             self.flip = False
@@ -71,9 +67,13 @@ class PhysicsEntity:
 
         self.animation.update()
 
-    def render(self, surf, offset=(0, 0)):
-        surf.blit(pygame.transform.flip(self.animation.img(), self.flip, False),
-                  (self.pos[0] - offset[0] + self.anim_offset[0], self.pos[1] - offset[1] + self.anim_offset[1]))
+    def render(self, surf, offset=(0, 0), shadow=None, alpha=1.0):
+        pos = (self.pos[0] - (self.pos[0] - self.prev_pos[0]) * (1 - alpha),
+               self.pos[1] - (self.pos[1] - self.prev_pos[1]) * (1 - alpha))
+        render_pos = (pos[0] - offset[0] + self.anim_offset[0], pos[1] - offset[1] + self.anim_offset[1])
+        surf.blit(self.animation.img(self.flip), render_pos)
+        if shadow:
+            shadow.blit(self.animation.shadow(self.flip), render_pos, special_flags=pygame.BLEND_RGBA_MAX)
 
 
 class Player(PhysicsEntity):
@@ -95,7 +95,7 @@ class Player(PhysicsEntity):
         self.anim_offset = [0, 0]
         if self.animation.frame in {2, 10} and self.action == 'shoot':
             self.game.screenshake = max(10, self.game.screenshake)
-            self.game.sfx['shoot'].play()
+            self.game.sfx.play('shoot')
             # print(self.animation.frame)
 
         self.air_time += 1
@@ -108,7 +108,7 @@ class Player(PhysicsEntity):
             self.air_time = 0
             self.jumps = 1
 
-        if pygame.mouse.get_pos()[0] < self.game.screen.get_width() // 2:
+        if self.game.mouse_pos[0] < self.game.screen.get_width() // 2:
             self.flip = True
         else:
             self.flip = False
@@ -148,16 +148,16 @@ class Player(PhysicsEntity):
             self.remove_signal('on_rope')
             self.gravity = True
 
-        self.gun.update(self.pos, self.size, self.flip)
+        self.gun.update(self.pos, self.size, self.flip, tilemap)
 
-    def render(self, surf, offset=(0, 0)):
-        super().render(surf, offset=offset)
+    def render(self, surf, offset=(0, 0), shadow=None, alpha=1.0):
+        super().render(surf, offset=offset, shadow=shadow, alpha=alpha)
 
     def render_hitbox(self, surf, offset=(0, 0)):
         pygame.draw.rect(
             surf,
             (0, 0, 0),
-            pygame.Rect((self.gun.rect_pos[0] - offset[0], self.gun.rect_pos[1] - offset[1]), self.gun.hitbox_size)
+            self.gun.rect().move(-offset[0], -offset[1])
         )
 
     def disable_gravity(self):
@@ -193,41 +193,3 @@ class Player(PhysicsEntity):
     def set_action_input(self, value):
         self.action_input = value
 
-
-class Ruhaan(PhysicsEntity):
-    def __init__(self, game, pos, size):
-        super().__init__(game, 'ruhaan', pos, size)
-
-        self.walking = 0
-
-    def update(self, tilemap, movement=(0, 0)):
-        if self.walking:
-            if tilemap.solid_check((self.rect().centerx + (-7 if self.flip else 7), self.pos[1] + 23)):
-                if self.collisions['right'] or self.collisions['left']:
-                    self.flip = not self.flip
-                else:
-                    movement = (movement[0] - 0.5 if self.flip else 0.5, movement[1])
-            else:
-                self.flip = not self.flip
-            self.walking = max(0, self.walking - 1)
-
-        elif random.random() < 0.01:
-            self.walking = random.randint(30, 120)
-
-        super().update(tilemap, movement=movement)
-
-        if movement[0] != 0:
-            self.set_action('run')
-        else:
-            self.set_action('idle')
-
-        if self.game.player.gun.rect().colliderect(self.rect()) and self.game.player.is_shooting():
-            self.game.screenshake = max(16, self.game.screenshake)
-            for i in range(30):
-                angle = random.random() * math.pi * 2
-                speed = random.random() * 5
-                self.game.sparks.append(Spark(self.rect().center, angle, 2 + random.random()))
-            return True
-
-    def render(self, surf, offset=(0, 0)):
-        super().render(surf, offset=offset)
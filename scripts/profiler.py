@@ -0,0 +1,211 @@
+from array import array
+import inspect
+import json
+import time
+import tracemalloc
+
+import pygame
+
+STAGE_COLORS = [
+    (230, 74, 34),
+    (245, 155, 66),
+    (255, 221, 87),
+    (120, 200, 80),
+    (64, 180, 170),
+    (80, 130, 230),
+    (150, 100, 220),
+    (220, 100, 180),
+    (200, 200, 200),
+    (110, 110, 110),
+]
+
+# traced heap peak reached outside exempt code since the frame began, the most any allocation_free call has raised
+# it, and what exempt calls have left on the heap since the frame began, mostly the float and tuple freelists they
+# refilled, which later readings are lowered by so it isn't charged to the code that runs after them
+# one-slot arrays rather than globals, so storing a new figure doesn't leave a fresh int object on the heap inside a
+# call being measured
+outside_peak = array('q', [0])
+hot_peak = array('q', [0])
+left_behind = array('q', [0])
+
+
+def exempt(func):
+    # for code that has to allocate every frame, like building the lists pygame's batch calls take, its heap use
+    # is left out of the profiler's figures
+    def exempted(*args, **kwargs):
+        if not tracemalloc.is_tracing():
+            return func(*args, **kwargs)
+        outside_peak[0] = max(tracemalloc.get_traced_memory()[1] - left_behind[0], outside_peak[0])
+        left_behind[0] -= tracemalloc.get_traced_memory()[0]
+        result = func(*args, **kwargs)
+        left_behind[0] += tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        return result
+    return exempted
+
+
+def allocation_free(func):
+    # marks the vectorised hot paths, once their buffers exist they must not raise the heap at all outside exempt
+    # calls, the rest of the frame is interpreter glue (loop iterators, the rects blit returns) and is only reported
+    signature = inspect.signature(func)
+
+    def checked(*args, **kwargs):
+        if not tracemalloc.is_tracing():
+            return func(*args, **kwargs)
+        if kwargs:
+            # passing keywords on copies them to the heap inside the measured call, so they're made positional first
+            args = signature.bind(*args, **kwargs).args
+            kwargs = {}
+        before = outside_peak[0]
+        start, outer = tracemalloc.get_traced_memory()
+        outer -= left_behind[0]
+        # read again so start counts the ints made above, the ones made here replace them one for one
+        start = tracemalloc.get_traced_memory()[0] - left_behind[0]
+        outside_peak[0] = 0
+        tracemalloc.reset_peak()
+        result = func(*args, **kwargs)
+        # the heap is read first, before reading a slot creates an int object of its own
+        peak = max(tracemalloc.get_traced_memory()[1] - left_behind[0], outside_peak[0])
+        hot_peak[0] = max(hot_peak[0], peak - start)
+        outside_peak[0] = max(before, outer, peak)
+        return result
+    return checked
+
+
+class Profiler:
+    def __init__(self, stages, size=240, graph_height=100, budget=1 / 60, track_allocations=False):
+        self.stages = list(stages)
+        self.index = {stage: i for i, stage in enumerate(self.stages)}
+        self.size = size
+        self.budget = budget
+
+        # ring buffer of per-stage durations, one row per frame
+        self.frames = [[0.0] * len(self.stages) for i in range(size)]
+        self.frame_starts = [0.0] * size
+        self.frame = -1
+        self.count = 0
+
+        # ring buffer of individual start/stop spans for trace export
+        self.span_capacity = size * len(self.stages) * 2
+        self.span_stage = [0] * self.span_capacity
+        self.span_start = [0.0] * self.span_capacity
+        self.span_end = [0.0] * self.span_capacity
+        self.span_index = 0
+        self.span_count = 0
+
+        self.running = [0.0] * len(self.stages)
+
+        # how far the traced python heap rose above where it stood when each frame began, outside exempt code, for
+        # the whole frame and for its allocation_free calls alone
+        # this is peak growth, not a count of bytes allocated, a frame that allocates and frees 1 KB over and over
+        # reports 1 KB
+        self.track_allocations = track_allocations
+        self.heap_peaks = [0] * size
+        self.hot_peaks = [0] * size
+        self.frame_memory = 0
+        if track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        self.graph_height = graph_height
+        self.graph = None
+        self.legend = None
+
+    def begin_frame(self):
+        if self.track_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            self.heap_peaks[self.frame] = max(0, max(peak - left_behind[0], outside_peak[0]) - self.frame_memory)
+            self.hot_peaks[self.frame] = hot_peak[0]
+            outside_peak[0] = 0
+            hot_peak[0] = 0
+            left_behind[0] = 0
+            tracemalloc.reset_peak()
+            # re-read after the bookkeeping above so it isn't charged to the next frame
+            self.frame_memory = tracemalloc.get_traced_memory()[0]
+        self.frame = (self.frame + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        self.frame_starts[self.frame] = time.perf_counter()
+        row = self.frames[self.frame]
+        for i in range(len(row)):
+            row[i] = 0.0
+
+    def start(self, stage):
+        self.running[self.index[stage]] = time.perf_counter()
+
+    def stop(self, stage):
+        end = time.perf_counter()
+        i = self.index[stage]
+        start = self.running[i]
+        self.frames[self.frame][i] += end - start
+
+        self.span_stage[self.span_index] = i
+        self.span_start[self.span_index] = start
+        self.span_end[self.span_index] = end
+        self.span_index = (self.span_index + 1) % self.span_capacity
+        self.span_count = min(self.span_count + 1, self.span_capacity)
+
+    def recent(self):
+        for i in range(self.count):
+            frame = (self.frame - self.count + 1 + i) % self.size
+            yield self.frame_starts[frame], self.frames[frame], self.heap_peaks[frame], self.hot_peaks[frame]
+
+    def heap_peak_stats(self, hot=False):
+        # finished frames only, the current one is still running
+        samples = [hot_peak if hot else heap_peak for start, row, heap_peak, hot_peak in self.recent()][:-1]
+        if not samples:
+            return 0, 0
+        return sum(samples) / len(samples), max(samples)
+
+    def export_csv(self, path):
+        f = open(path, 'w')
+        f.write('frame_start_ms,' + ','.join(stage + '_ms' for stage in self.stages) + ',total_ms,heap_peak_bytes,'
+                'hot_heap_peak_bytes\n')
+        for start, row, heap_peak, hot_peak in self.recent():
+            f.write(f'{start * 1000:.3f},' + ','.join(f'{d * 1000:.4f}' for d in row)
+                    + f',{sum(row) * 1000:.4f},{heap_peak},{hot_peak}\n')
+        f.close()
+
+    def export_trace(self, path):
+        # chrome://tracing / Perfetto "complete" events, timestamps in microseconds
+        events = []
+        for i in range(self.span_count):
+            span = (self.span_index - self.span_count + i) % self.span_capacity
+            events.append({'name': self.stages[self.span_stage[span]], 'cat': 'frame', 'ph': 'X', 'pid': 0, 'tid': 0,
+                           'ts': self.span_start[span] * 1e6,
+                           'dur': (self.span_end[span] - self.span_start[span]) * 1e6})
+        f = open(path, 'w')
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        f.close()
+
+    def column(self, row):
+        # stacked bar for one frame, drawn at the right edge of the scrolling graph
+        x = self.size - 1
+        self.graph.fill((0, 0, 0, 150), (x, 0, 1, self.graph_height))
+        y = self.graph_height
+        scale = self.graph_height / (self.budget * 2)
+        for i, duration in enumerate(row):
+            h = duration * scale
+            if h >= 0.5:
+                top = max(0, y - h)
+                self.graph.fill(STAGE_COLORS[i % len(STAGE_COLORS)], (x, round(top), 1, round(y) - round(top)))
+                y = top
+        self.graph.set_at((x, self.graph_height // 2), (255, 255, 255))
+
+    def render(self, surf, font, pos=(10, 50)):
+        if not self.graph:
+            self.graph = pygame.Surface((self.size, self.graph_height), pygame.SRCALPHA)
+            self.graph.fill((0, 0, 0, 150))
+            self.legend = [font.render(stage, False, STAGE_COLORS[i % len(STAGE_COLORS)])
+                           for i, stage in enumerate(self.stages)]
+
+        # the last finished frame is the one before the current one
+        self.graph.scroll(-1, 0)
+        self.column(self.frames[(self.frame - 1) % self.size])
+
+        surf.blit(self.graph, pos)
+        for i, label in enumerate(self.legend):
+            surf.blit(label, (pos[0] + self.size + 6, pos[1] + i * label.get_height()))
+        if self.track_allocations:
+            last = (self.frame - 1) % self.size
+            surf.blit(font.render(f'heap peak +{self.heap_peaks[last]} B, hot paths +{self.hot_peaks[last]} B', False,
+                                  (255, 255, 255)),
+                      (pos[0], pos[1] + self.graph_height + 2))
@@ -0,0 +1,88 @@
+import struct
+
+import pygame
+
+# header, then runs of identical ticks: repeat count, mouse position, event count, then that many events
+REPLAY_MAGIC = b'RLRP'
+REPLAY_VERSION = 1
+REPLAY_HEADER = struct.Struct('<4sHIH')
+TICK_RUN = struct.Struct('<HhhB')
+EVENT_ENTRY = struct.Struct('<BI')
+
+# only the input the simulation reacts to is recorded, key events store the key and mouse events the button
+EVENT_TYPES = [pygame.KEYDOWN, pygame.KEYUP, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP]
+
+
+class Recorder:
+    def __init__(self, path, seed, level=0):
+        self.f = open(path, 'wb')
+        self.f.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, seed, level))
+        self.mouse_pos = None
+        self.repeat = 0
+        self.ticks = 0
+
+    def record(self, mouse_pos, events):
+        events = [event for event in events if event.type in EVENT_TYPES]
+        mouse_pos = (int(mouse_pos[0]), int(mouse_pos[1]))
+        self.ticks += 1
+        # quiet ticks with the mouse at rest fold into the current run
+        if not events and mouse_pos == self.mouse_pos and self.repeat < 0xffff:
+            self.repeat += 1
+            return
+        self.flush()
+        self.mouse_pos = mouse_pos
+        if events:
+            self.f.write(TICK_RUN.pack(1, mouse_pos[0], mouse_pos[1], len(events)))
+            for event in events:
+                value = event.key if event.type in {pygame.KEYDOWN, pygame.KEYUP} else event.button
+                self.f.write(EVENT_ENTRY.pack(EVENT_TYPES.index(event.type), value))
+        else:
+            self.repeat = 1
+
+    def flush(self):
+        if self.repeat:
+            self.f.write(TICK_RUN.pack(self.repeat, self.mouse_pos[0], self.mouse_pos[1], 0))
+            self.repeat = 0
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+
+class Replay:
+    def __init__(self, path):
+        f = open(path, 'rb')
+        self.data = f.read()
+        f.close()
+        magic, version, self.seed, self.level = REPLAY_HEADER.unpack_from(self.data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f'{path} is not a version {REPLAY_VERSION} replay')
+        self.offset = REPLAY_HEADER.size
+        self.repeat = 0
+        self.mouse_pos = (0, 0)
+        self.ticks = 0
+
+    def next_tick(self):
+        # mouse position and events for the next tick, None once the recording runs out
+        if self.repeat:
+            self.repeat -= 1
+            self.ticks += 1
+            return self.mouse_pos, []
+        if self.offset >= len(self.data):
+            return None
+
+        repeat, x, y, count = TICK_RUN.unpack_from(self.data, self.offset)
+        self.offset += TICK_RUN.size
+        self.mouse_pos = (x, y)
+        events = []
+        for i in range(count):
+            kind, value = EVENT_ENTRY.unpack_from(self.data, self.offset)
+            self.offset += EVENT_ENTRY.size
+            event_type = EVENT_TYPES[kind]
+            if event_type in {pygame.KEYDOWN, pygame.KEYUP}:
+                events.append(pygame.event.Event(event_type, key=value))
+            else:
+                events.append(pygame.event.Event(event_type, button=value, pos=self.mouse_pos))
+        self.repeat = repeat - 1
+        self.ticks += 1
+        return self.mouse_pos, events
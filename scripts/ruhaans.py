@@ -0,0 +1,344 @@
+import random
+
+import numpy as np
+import pygame
+
+from scripts.profiler import allocation_free, exempt
+
+# per-enemy state, every field is an array with one row per enemy
+FIELDS = {
+    'pos': ((2,), float),
+    'prev_pos': ((2,), float),
+    'velocity': ((), float),
+    'walking': ((), int),
+    'flip': ((), bool),
+    'blocked': ((), bool),
+    'action': ((), int),
+    'frame': ((), int),
+}
+ACTIONS = ['idle', 'run']
+# per-tick temporaries of update, and of render after it, kept across ticks so stepping enemies allocates nothing that
+# scales with them
+SCRATCH = {
+    'numbers': (3, float),
+    'indices': (4, int),
+    'masks': (6, bool),
+}
+
+
+class Ruhaans:
+    # batched enemies, patrol AI and tile collisions run as one vectorized pass per tick
+    def __init__(self, game, size=(16, 16), capacity=64, cell_size=16):
+        self.game = game
+        self.size = size
+        self.count = 0
+        # broad-phase for collide, enemy indices sorted by the cell of their top-left corner, re-sorted on cell changes
+        self.cell_size = cell_size
+        self.cells = None
+        self.moved = False
+        for name, (shape, dtype) in FIELDS.items():
+            setattr(self, name, np.zeros((capacity,) + shape, dtype=dtype))
+        for name, (rows, dtype) in SCRATCH.items():
+            setattr(self, name, np.zeros((rows, capacity), dtype=dtype))
+        self.views = None
+        self.drawn = None
+        self.rng = np.random.default_rng(random.getrandbits(32))
+        # 0-d slots for the numbers render hands to ufuncs, which would otherwise convert them to a fresh array per
+        # call, the surface bounds only change with the target surface
+        self.target = None
+        self.blend = np.zeros(())
+        self.scroll = (np.zeros(()), np.zeros(()))
+        self.lows = (np.array(-size[0], dtype=float), np.array(-size[1], dtype=float))
+        self.highs = (np.zeros(()), np.zeros(()))
+
+        animations = [game.assets['ruhaan/' + action] for action in ACTIONS]
+        self.img_durations = np.array([animation.img_duration for animation in animations])
+        self.periods = np.array([animation.img_duration * len(animation.images) for animation in animations])
+        # images[action][flip][frame], shadows use the same layout
+        self.images = [animation.frames for animation in animations]
+        self.shadows = [animation.shadows for animation in animations]
+
+    def __len__(self):
+        return self.count
+
+    def reserve(self, amount):
+        if self.count + amount > len(self.pos):
+            capacity = max(len(self.pos) * 2, self.count + amount)
+            for name in FIELDS:
+                old = getattr(self, name)
+                new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+                new[:self.count] = old[:self.count]
+                setattr(self, name, new)
+            for name, (rows, dtype) in SCRATCH.items():
+                setattr(self, name, np.zeros((rows, capacity), dtype=dtype))
+            self.views = None
+            self.drawn = None
+
+    def add(self, pos):
+        self.reserve(1)
+        for name in FIELDS:
+            getattr(self, name)[self.count] = 0
+        self.pos[self.count] = pos
+        self.prev_pos[self.count] = pos
+        self.count += 1
+        self.cells = None
+
+    def clear(self):
+        self.count = 0
+        self.cells = None
+
+    def remove(self, indices):
+        keep = np.ones(self.count, dtype=bool)
+        keep[indices] = False
+        amount = int(keep.sum())
+        for name in FIELDS:
+            array = getattr(self, name)
+            array[:amount] = array[:self.count][keep]
+        self.count = amount
+        self.cells = None
+
+    def take(self, indices):
+        # removes enemies and hands back their positions, everything else about them is dropped
+        positions = self.pos[indices].tolist()
+        self.remove(indices)
+        return positions
+
+    def rects(self):
+        # integer left/top like pygame.Rect, which truncates float positions
+        return np.trunc(self.pos[:self.count]).astype(int)
+
+    def buckets(self):
+        if self.cells is None or self.moved:
+            self.moved = False
+            cells = self.rects() // self.cell_size
+            # enemies crawl, so on most ticks none of them changed cell and the last sort still holds
+            if self.cells is None or not np.array_equal(cells, self.cells[0]):
+                origin = cells.min(axis=0)
+                span = int(cells[:, 0].max() - origin[0]) + 1
+                keys = (cells[:, 1] - origin[1]) * span + cells[:, 0] - origin[0]
+                order = np.argsort(keys)
+                self.cells = (cells, origin.tolist(), span, keys[order], order)
+        return self.cells[1:]
+
+    def collide(self, rect):
+        # indices of the enemies overlapping rect, in index order
+        if not self.count:
+            return np.zeros(0, dtype=int)
+        (origin_x, origin_y), span, keys, order = self.buckets()
+        # an enemy's corner cell can be up to its own size before the rect
+        x0 = max((int(rect[0]) - self.size[0]) // self.cell_size - origin_x, 0)
+        x1 = min((int(rect[0]) + int(rect[2])) // self.cell_size - origin_x, span - 1)
+        y0 = max((int(rect[1]) - self.size[1]) // self.cell_size - origin_y, 0)
+        y1 = (int(rect[1]) + int(rect[3])) // self.cell_size - origin_y
+        if x0 > x1 or y0 > y1:
+            return np.zeros(0, dtype=int)
+
+        # each row of cells is one run of keys
+        rows = np.arange(y0, y1 + 1) * span
+        starts = np.searchsorted(keys, rows + x0)
+        ends = np.searchsorted(keys, rows + x1, side='right')
+        candidates = np.concatenate([order[start:end] for start, end in zip(starts.tolist(), ends.tolist())])
+        if len(candidates) > 1:
+            candidates.sort()
+        # take rather than fancy indexing, which sets up an iterator big enough to dwarf a handful of rows
+        corners = np.trunc(self.pos.take(candidates, axis=0)).astype(int)
+        return candidates.compress((corners[:, 0] < rect[0] + rect[2]) & (corners[:, 0] + self.size[0] > rect[0])
+                                   & (corners[:, 1] < rect[1] + rect[3]) & (corners[:, 1] + self.size[1] > rect[1]))
+
+    def visible(self, tilemap, point):
+        # mask of the enemies with an unobstructed line from their center to point
+        return tilemap.line_of_sight(self.rects() + np.array(self.size) // 2, point)
+
+    def hit(self, indices):
+        corners = self.rects()
+        for i in indices:
+            self.game.screenshake = max(16, self.game.screenshake)
+            self.game.sparks.random_burst((corners[i, 0] + self.size[0] // 2, corners[i, 1] + self.size[1] // 2), 30,
+                                          min_speed=2, max_speed=3)
+        self.remove(indices)
+
+    @exempt
+    def batch(self, n):
+        # views of the first n rows of every field update touches, and of the scratch, kept while n and the
+        # buffers stay the same so a tick doesn't even allocate the view objects, rebuilding them is exempt
+        if self.views is None or self.views[0] != n:
+            pos = self.pos[:n]
+            self.views = (n, (pos, self.prev_pos[:n], pos[:, 0], pos[:, 1], self.flip[:n], self.walking[:n],
+                              self.velocity[:n], self.blocked[:n], self.action[:n], self.frame[:n],
+                              *self.numbers[:, :n], *self.indices[:, :n], *self.masks[:, :n]))
+        return self.views[1]
+
+    # not allocation_free, numpy's where= masks, the Generator and python scalars cost a fixed few hundred bytes per
+    # call, nothing here grows with the enemy count
+    def update(self, tilemap):
+        n = self.count
+        if not n:
+            return
+        self.moved = True
+
+        tile_size = tilemap.tile_size
+        w, h = self.size
+        (pos, prev_pos, x, y, flip, walking, velocity, blocked, action, frame, probe, movement, roll, left, top, column,
+         row, active, ground, turn, step, hit, other) = self.batch(n)
+        prev_pos[:] = pos
+
+        # patrol: walk until the ledge probe finds no ground or a wall was hit, then turn around
+        np.greater(walking, 0, out=active)
+        np.trunc(x, out=probe)
+        probe += w // 2 + 7
+        np.subtract(probe, 14, out=probe, where=flip)
+        probe //= tile_size
+        column[:] = probe
+        np.add(y, 23, out=probe)
+        probe //= tile_size
+        row[:] = probe
+        tilemap.solid_tiles(column, row, out=ground)
+        np.logical_not(ground, out=turn)
+        turn |= blocked
+        turn &= active
+        np.logical_not(blocked, out=step)
+        step &= ground
+        step &= active
+        flip ^= turn
+        movement.fill(0.5)
+        np.negative(movement, out=movement, where=flip)
+        movement *= step
+        walking -= active
+
+        self.rng.random(out=roll)
+        np.less(roll, 0.01, out=other)
+        np.logical_not(active, out=ground)
+        other &= ground
+        starting = np.count_nonzero(other)
+        if starting:
+            walking[other] = self.rng.integers(30, 121, size=starting)
+
+        # x axis, only the leading column can be entered
+        x += movement
+        self.corners(x, y, left, top, probe)
+        np.greater(movement, 0, out=other)
+        column[:] = left
+        np.add(column, w - 1, out=column, where=other)
+        column //= tile_size
+        self.edge(tilemap, column, top, h, row, hit, ground)
+        np.not_equal(movement, 0, out=ground)
+        hit &= ground
+        self.resolve(x, column, tile_size, w, movement, hit, ground, probe)
+        blocked[:] = hit
+
+        # y axis
+        y += velocity
+        self.corners(x, y, left, top, probe)
+        np.greater(velocity, 0, out=other)
+        row[:] = top
+        np.add(row, h - 1, out=row, where=other)
+        row //= tile_size
+        self.edge(tilemap, row, left, w, column, hit, ground, across=True)
+        np.not_equal(velocity, 0, out=ground)
+        hit &= ground
+        self.resolve(y, row, tile_size, h, velocity, hit, ground, probe)
+
+        velocity += 0.1
+        np.minimum(velocity, 5, out=velocity)
+        np.putmask(velocity, hit, 0)
+
+        # animation advances on the current action, then restarts if the action changed
+        np.take(self.periods, action, out=left)
+        frame += 1
+        np.remainder(frame, left, out=frame)
+        np.not_equal(movement, 0, out=ground)
+        np.not_equal(ground, action, out=other)
+        np.putmask(frame, other, 0)
+        action[:] = ground
+
+    @staticmethod
+    def corners(x, y, left, top, scratch):
+        # integer left/top like rects(), written into left and top
+        np.trunc(x, out=scratch)
+        left[:] = scratch
+        np.trunc(y, out=scratch)
+        top[:] = scratch
+
+    @staticmethod
+    def edge(tilemap, line, start, length, scratch, out, solid, across=False):
+        # out = whether either tile along a leading edge is solid, the edge sits on tile line `line` and runs
+        # `length` pixels from pixel `start` on the other axis (columns for the x axis, rows when across)
+        tile_size = tilemap.tile_size
+        for corner in (0, length - 1):
+            np.add(start, corner, out=scratch)
+            scratch //= tile_size
+            if across:
+                tilemap.solid_tiles(scratch, line, out=solid)
+            else:
+                tilemap.solid_tiles(line, scratch, out=solid)
+            if corner:
+                out |= solid
+            else:
+                out[:] = solid
+
+    @staticmethod
+    def resolve(pos, line, tile_size, size, movement, hit, mask, scratch):
+        # snaps the enemies that hit a tile back against it, flush with its near side
+        np.multiply(line, tile_size, out=scratch)
+        np.greater(movement, 0, out=mask)
+        mask &= hit
+        scratch -= size
+        np.copyto(pos, scratch, where=mask)
+        scratch += size + tile_size
+        np.less(movement, 0, out=mask)
+        mask &= hit
+        np.copyto(pos, scratch, where=mask)
+
+    @exempt
+    def drawing(self, n):
+        # like batch, the views render works in, its buffers are update's scratch rows, which are dead by then
+        if self.drawn is None or self.drawn[0] != n:
+            self.drawn = (n, (self.pos[:n, 0], self.pos[:n, 1], self.prev_pos[:n, 0], self.prev_pos[:n, 1],
+                              *self.numbers[:2, :n], *self.masks[:2, :n]))
+        return self.drawn[1]
+
+    @allocation_free
+    def render(self, surf, offset=(0, 0), shadow=None, alpha=1.0):
+        n = self.count
+        if not n:
+            return
+
+        if surf is not self.target:
+            self.target = surf
+            self.highs[0][()], self.highs[1][()] = surf.get_size()
+        self.blend[()] = 1 - alpha
+        x, y, prev_x, prev_y, draw_x, draw_y, visible, inside = self.drawing(n)
+        self.interpolate(x, prev_x, draw_x, self.scroll[0], offset[0])
+        self.interpolate(y, prev_y, draw_y, self.scroll[1], offset[1])
+        np.greater(draw_x, self.lows[0], out=visible)
+        np.less(draw_x, self.highs[0], out=inside)
+        visible &= inside
+        np.greater(draw_y, self.lows[1], out=inside)
+        visible &= inside
+        np.less(draw_y, self.highs[1], out=inside)
+        visible &= inside
+        self.blit(surf, shadow, draw_x, draw_y, visible)
+
+    def interpolate(self, pos, prev_pos, out, scroll_slot, scroll):
+        # out = pos - (pos - prev_pos) * (1 - alpha) - scroll, along one axis
+        np.subtract(pos, prev_pos, out=out)
+        out *= self.blend
+        np.subtract(pos, out, out=out)
+        scroll_slot[()] = scroll
+        out -= scroll_slot
+
+    @exempt
+    def blit(self, surf, shadow, x, y, visible):
+        # blits takes fresh lists of python tuples, picking out the visible enemies for them is all that allocates
+        visible = np.flatnonzero(visible)
+        if not len(visible):
+            return
+
+        action = self.action.take(visible)
+        state = list(zip(action.tolist(), self.flip.take(visible).tolist(),
+                         (self.frame.take(visible) // self.img_durations.take(action)).tolist(),
+                         x.take(visible).tolist(), y.take(visible).tolist()))
+        surf.blits([(self.images[a][f][i], (px, py)) for a, f, i, px, py in state], doreturn=False)
+        if shadow:
+            shadow.blits([(self.shadows[a][f][i], (px, py), None, pygame.BLEND_RGBA_MAX) for a, f, i, px, py in state],
+                         doreturn=False)
@@ -1,34 +1,228 @@
 import math
+import random
+
+import numpy as np
 import pygame
 
+from scripts.profiler import allocation_free, exempt
+from scripts.utils import SHADOW_COLOR
+
+
+# never a spark colour, like the magenta the image colorkey uses
+SPARK_COLORKEY = (255, 0, 255)
+
+# per-spark state, every field is an array with one row per spark
+FIELDS = {
+    'pos': ((2,), float),
+    'direction': ((2,), float),
+    'speed': ((), float),
+    'live': ((), bool),
+    'expired': ((), bool),
+}
+# per-frame temporaries of update and render, rows of the same length as the fields
+SCRATCH = {
+    'numbers': (7, float),
+    'masks': (2, bool),
+}
+
+# 0-d arrays for the constants the per-frame ufuncs take, a python number would be converted to a fresh array per call
+LENGTH = np.array(3.0)
+WIDTH = np.array(0.5)
+DRAG = np.array(0.1)
+STOPPED = np.array(0.0)
+MARGIN = np.array(1.0)
+
+
+class Sparks:
+    def __init__(self, capacity=256):
+        for name, (shape, dtype) in FIELDS.items():
+            setattr(self, name, np.zeros((capacity,) + shape, dtype=dtype))
+        for name, (rows, dtype) in SCRATCH.items():
+            setattr(self, name, np.zeros((rows, capacity), dtype=dtype))
+        self.points = np.zeros((capacity, 4, 2))
+        # sparks that hit zero speed are still drawn on the frame they die and dropped on the next update, the dead
+        # ones keep their rows until the next burst squeezes them out, so a tick never moves or allocates anything
+        self.count = 0
+        self.views = None
+        self.rng = np.random.default_rng(random.getrandbits(32))
+        # colours are picked while rendering, which runs a varying number of times per tick, so they get their own
+        # unseeded stream and the simulation stream above only advances in update
+        self.color_rng = np.random.default_rng()
+        self.layer = None
+        # 0-d slots for the frame's scroll and the surface bounds, which only change with the target surface
+        self.target = None
+        self.scroll = (np.zeros(()), np.zeros(()))
+        self.highs = (np.zeros(()), np.zeros(()))
+
+    def __len__(self):
+        return int(np.count_nonzero(self.live[:self.count]))
 
-class Spark:
-    def __init__(self, pos, angle, speed):
-        self.pos = list(pos)
-        self.angle = angle
-        self.speed = speed
+    def reserve(self, amount):
+        if self.count + amount > len(self.speed):
+            capacity = max(len(self.speed) * 2, self.count + amount)
+            for name in FIELDS:
+                old = getattr(self, name)
+                new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+                new[:self.count] = old[:self.count]
+                setattr(self, name, new)
+            for name, (rows, dtype) in SCRATCH.items():
+                setattr(self, name, np.zeros((rows, capacity), dtype=dtype))
+            self.points = np.zeros((capacity, 4, 2))
+            self.views = None
 
+    def compact(self):
+        keep = np.flatnonzero(self.live[:self.count])
+        if len(keep) < self.count:
+            amount = len(keep)
+            for name in FIELDS:
+                array = getattr(self, name)
+                array[:amount] = array[keep]
+            self.count = amount
+            self.views = None
+
+    def add(self, pos, angle, speed):
+        self.burst(pos, np.array([angle]), np.array([speed]))
+
+    def burst(self, pos, angles, speeds):
+        self.compact()
+        amount = len(angles)
+        self.reserve(amount)
+        new = slice(self.count, self.count + amount)
+        self.pos[new] = pos
+        self.direction[new, 0] = np.cos(angles)
+        self.direction[new, 1] = np.sin(angles)
+        self.speed[new] = speeds
+        self.live[new] = True
+        self.expired[new] = False
+        self.count += amount
+        self.views = None
+
+    def random_burst(self, pos, amount, min_speed=0, max_speed=10):
+        self.burst(pos, self.rng.random(amount) * math.pi * 2,
+                   min_speed + self.rng.random(amount) * (max_speed - min_speed))
+
+    def clear(self):
+        self.count = 0
+        self.views = None
+
+    @exempt
+    def batch(self, n):
+        # views of the first n rows, per axis where the work is per axis, kept while n and the buffers stay the same
+        # so a frame doesn't even allocate the view objects, rebuilding them after a burst is the exempt part
+        if self.views is None or self.views[0] != n:
+            shared = (self.speed[:n], self.live[:n], self.expired[:n], *self.numbers[:3, :n], *self.masks[:, :n])
+            # plain loops, a comprehension here would close over n and cost two cell objects on every call
+            axes = []
+            for axis in (0, 1):
+                corners = self.points[:n, :, axis]
+                axes.append((self.pos[:n, axis], self.direction[:n, axis], *self.numbers[3 + axis::2, :n],
+                             (corners[:, 0], corners[:, 1], corners[:, 2], corners[:, 3])))
+            self.views = (n, shared, tuple(axes))
+        return self.views[1], self.views[2]
+
+    @allocation_free
     def update(self):
-        self.pos[0] += math.cos(self.angle) * self.speed
-        self.pos[1] += math.sin(self.angle) * self.speed
+        n = self.count
+        if not n:
+            return
+
+        shared, (axis_x, axis_y) = self.batch(n)
+        speed, live, expired, step, reach, bound, visible, inside = shared
+        x, dx, long_x, short_x, corners_x = axis_x
+        y, dy, long_y, short_y, corners_y = axis_y
+        # live and not expired on the last update
+        np.greater(live, expired, out=live)
+        np.multiply(dx, speed, out=step)
+        x += step
+        np.multiply(dy, speed, out=step)
+        y += step
+        speed -= DRAG
+        np.maximum(speed, STOPPED, out=speed)
+        np.equal(speed, STOPPED, out=expired)
+
+    @allocation_free
+    def render(self, surf, colors=((255, 255, 255),), offset=(0, 0), shadow=None):
+        n = self.count
+        if not n:
+            return
 
-        self.speed = max(0, self.speed - 0.1)
-        return not self.speed
+        if surf is not self.target:
+            self.target = surf
+            self.highs[0][()], self.highs[1][()] = surf.get_size()
+        shared, (axis_x, axis_y) = self.batch(n)
+        speed, live, expired, step, reach, bound, visible, inside = shared
+        x, dx, long_x, short_x, corners_x = axis_x
+        y, dy, long_y, short_y, corners_y = axis_y
+        # a quad three speeds long and half a speed wide either side, along the direction of travel
+        np.multiply(dx, speed, out=long_x)
+        long_x *= LENGTH
+        np.multiply(dy, speed, out=long_y)
+        long_y *= LENGTH
+        np.multiply(dy, speed, out=short_x)
+        short_x *= WIDTH
+        np.negative(short_x, out=short_x)
+        np.multiply(dx, speed, out=short_y)
+        short_y *= WIDTH
 
-    def render(self, surf, color=(255, 255, 255), offset=(0, 0)):
-        render_points = [
-            (self.pos[0] + math.cos(self.angle) * self.speed * 3 - offset[0],
-             self.pos[1] + math.sin(self.angle) * self.speed * 3 - offset[1]),
+        # skip anything whose longest axis can't reach the surface
+        np.multiply(speed, LENGTH, out=reach)
+        reach += MARGIN
+        np.copyto(visible, live)
+        self.place(x, long_x, short_x, corners_x, self.scroll[0], offset[0], reach, self.highs[0], bound, visible,
+                   inside, step)
+        self.place(y, long_y, short_y, corners_y, self.scroll[1], offset[1], reach, self.highs[1], bound, visible,
+                   inside, step)
+        self.draw(surf, colors, shadow, visible)
 
-            (self.pos[0] + math.cos(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[0],
-             self.pos[1] + math.sin(self.angle + math.pi * 0.5) * self.speed * 0.5 - offset[1]),
+    @staticmethod
+    def place(pos, long, short, corners, scroll_slot, scroll, reach, high, bound, visible, inside, drawn):
+        # one axis of the quads' corners on the surface, and clears visible for sparks off it along that axis
+        scroll_slot[()] = scroll
+        np.subtract(pos, scroll_slot, out=drawn)
+        front, side, back, other_side = corners
+        np.add(drawn, long, out=front)
+        np.add(drawn, short, out=side)
+        np.subtract(drawn, long, out=back)
+        np.subtract(drawn, short, out=other_side)
+        np.negative(reach, out=bound)
+        np.greater(drawn, bound, out=inside)
+        visible &= inside
+        np.add(reach, high, out=bound)
+        np.less(drawn, bound, out=inside)
+        visible &= inside
 
-            (self.pos[0] + math.cos(self.angle + math.pi) * self.speed * 3 - offset[0],
-             self.pos[1] + math.sin(self.angle + math.pi) * self.speed * 3 - offset[1]),
+    @exempt
+    def draw(self, surf, colors, shadow, visible):
+        # draw.polygon takes python lists, picking out the visible quads for it is all that allocates
+        index = np.flatnonzero(visible)
+        if not len(index):
+            return
 
-            (self.pos[0] + math.cos(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[0],
-             self.pos[1] + math.sin(self.angle - math.pi * 0.5) * self.speed * 0.5 - offset[1]),
+        points = self.points.take(index, axis=0)
+        quads = zip(points.tolist(), self.color_rng.integers(len(colors), size=len(index)).tolist())
 
-        ]
+        draw_polygon = pygame.draw.polygon
+        if not shadow:
+            for quad, color in quads:
+                draw_polygon(surf, colors[color], quad)
+            return
 
-        pygame.draw.polygon(surf, color, render_points)
+        # every spark is drawn once onto a colorkeyed layer, which is copied onto surf and turned into one
+        # silhouette for the shadow, only the box the sparks can touch is cleared and copied
+        if self.layer is None or self.layer.get_size() != surf.get_size():
+            self.layer = pygame.Surface(surf.get_size())
+            self.layer.set_colorkey(SPARK_COLORKEY)
+        low = points.min(axis=(0, 1)).tolist()
+        high = points.max(axis=(0, 1)).tolist()
+        area = pygame.Rect(int(low[0]) - 1, int(low[1]) - 1, int(high[0] - low[0]) + 3,
+                           int(high[1] - low[1]) + 3).clip(self.layer.get_rect())
+        self.layer.fill(SPARK_COLORKEY, area)
+        for quad, color in quads:
+            draw_polygon(self.layer, colors[color], quad)
+        surf.blit(self.layer, area, area)
+        # SHADOW_COLOR is black, so a silhouette blitted with BLEND_RGBA_MAX only ever raises alpha
+        drawn = pygame.surfarray.pixels2d(self.layer)[area.left:area.right, area.top:area.bottom]
+        shadow_alpha = pygame.surfarray.pixels_alpha(shadow)[area.left:area.right, area.top:area.bottom]
+        np.maximum(shadow_alpha, (drawn != self.layer.map_rgb(SPARK_COLORKEY)) * np.uint8(SHADOW_COLOR[3]),
+                   out=shadow_alpha)
+        del drawn, shadow_alpha
@@ -0,0 +1,46 @@
+class SpatialHash:
+    def __init__(self, cell_size=16):
+        self.cell_size = cell_size
+        # cells map to insertion ordered dicts so queries come back in a stable order
+        self.cells = {}
+        self.entity_cells = {}
+
+    def clear(self):
+        self.cells = {}
+        self.entity_cells = {}
+
+    def cell_range(self, x, y, w, h):
+        return (int(x // self.cell_size), int(y // self.cell_size),
+                int((x + w) // self.cell_size), int((y + h) // self.cell_size))
+
+    def insert(self, entity, rect):
+        # anything hashable can be stored under its bounds
+        cell_range = self.cell_range(rect[0], rect[1], rect[2], rect[3])
+        self.entity_cells[entity] = cell_range
+        for x in range(cell_range[0], cell_range[2] + 1):
+            for y in range(cell_range[1], cell_range[3] + 1):
+                cell = self.cells.get((x, y))
+                if cell is None:
+                    cell = self.cells[(x, y)] = {}
+                cell[entity] = None
+
+    def remove(self, entity):
+        cell_range = self.entity_cells.pop(entity, None)
+        if not cell_range:
+            return
+        for x in range(cell_range[0], cell_range[2] + 1):
+            for y in range(cell_range[1], cell_range[3] + 1):
+                cell = self.cells[(x, y)]
+                del cell[entity]
+                if not cell:
+                    del self.cells[(x, y)]
+
+    def query(self, rect):
+        cell_range = self.cell_range(rect[0], rect[1], rect[2], rect[3])
+        found = {}
+        for x in range(cell_range[0], cell_range[2] + 1):
+            for y in range(cell_range[1], cell_range[3] + 1):
+                cell = self.cells.get((x, y))
+                if cell:
+                    found.update(cell)
+        return list(found)
@@ -1,37 +1,62 @@
 import random
 import math
 
+import numpy as np
 
-class Star:
-    def __init__(self, pos, img, speed, depth):
-        self.pos = list(pos)
-        self.img = img
-        self.speed = speed
-        self.depth = depth
-
-    def update(self):
-        self.pos[0] += self.speed
-
-    def render(self, surf, offset=(0, 0)):
-        render_pos = (self.pos[0] - offset[0] * self.depth, self.pos[1] - offset[1] * self.depth)
-        surf.blit(self.img, (render_pos[0] % (surf.get_width() + self.img.get_width()) - self.img.get_width(),
-                             render_pos[1] % (surf.get_height() + self.img.get_height()) - self.img.get_height()))
+from scripts.profiler import allocation_free, exempt
 
 
 class Stars:
+    # stars live in parallel arrays sorted back to front, so a frame is one vector update and one blits call
     def __init__(self, star_images, count=16):
-        self.stars = []
-
+        images = []
+        rows = []
         for i in range(count):
-            self.stars.append(Star((random.random() * 99999, random.random() * 99999), random.choice(star_images),
-                                     0, random.random() * 0.6 + 0.2))
-
-        self.stars.sort(key=lambda x: x.depth)
-
+            pos = (random.random() * 99999, random.random() * 99999)
+            images.append(random.choice(star_images))
+            rows.append((pos[0], pos[1], 0, random.random() * 0.6 + 0.2))
+        rows = np.array(rows, dtype=float).reshape(-1, 4)
+
+        order = np.argsort(rows[:, 3], kind='stable')
+        self.pos = rows[order, :2]
+        self.speed = rows[order, 2]
+        self.depth = rows[order, 3:]
+        self.images = [images[i] for i in order]
+        self.sizes = np.array([img.get_size() for img in self.images], dtype=float).reshape(-1, 2)
+        self.window = np.zeros_like(self.sizes)
+        self.render_pos = np.zeros_like(self.sizes)
+        # the wrap window only changes with the target surface
+        self.target = None
+        # per-axis views of everything, plus a 0-d slot for the frame's scroll, made once so a frame works in place
+        # without creating views or converting python numbers to arrays
+        self.axes = [(self.pos[:, axis], self.sizes[:, axis], self.window[:, axis], self.render_pos[:, axis],
+                      np.zeros(())) for axis in (0, 1)]
+        self.depths = self.depth[:, 0]
+
+    @allocation_free
     def update(self):
-        for star in self.stars:
-            star.update()
+        x = self.axes[0][0]
+        x += self.speed
 
+    @allocation_free
     def render(self, surf, offset=(0, 0)):
-        for star in self.stars:
-            star.render(surf, offset=offset)
\ No newline at end of file
+        if surf is not self.target:
+            # wrap into a window one sprite larger than the surface so sprites slide in from the edges
+            self.target = surf
+            np.add(self.sizes, surf.get_size(), out=self.window)
+        self.wrap(self.axes[0], offset[0])
+        self.wrap(self.axes[1], offset[1])
+        self.blit(surf)
+
+    def wrap(self, axis, scroll):
+        pos, sizes, window, render_pos, scroll_slot = axis
+        scroll_slot[()] = scroll
+        np.multiply(self.depths, scroll_slot, out=render_pos)
+        np.subtract(pos, render_pos, out=render_pos)
+        np.mod(render_pos, window, out=render_pos)
+        render_pos -= sizes
+
+    @exempt
+    def blit(self, surf):
+        # blits takes a fresh list of python tuples, the one thing a frame has to allocate here
+        surf.blits(list(zip(self.images, self.render_pos.tolist())), doreturn=False)
@@ -0,0 +1,154 @@
+import queue
+import threading
+
+import numpy as np
+
+from scripts.tilemap import CHUNK_SIZE, MapFile
+
+SPAWNER_TYPE = 'spawners'
+
+
+class LevelStreamer:
+    # keeps only the chunks near the camera resident, loading them on a background thread
+    def __init__(self, game, path, radius=2):
+        self.game = game
+        self.tilemap = game.tilemap
+        self.radius = radius
+        self.map_file = MapFile(path)
+
+        self.tilemap.clear()
+        self.tilemap.tile_size = self.map_file.tile_size
+        self.table = self.tilemap.type_table(self.map_file.types)
+        self.spawner_id = self.tilemap.type_id(SPAWNER_TYPE)
+        self.chunk_px = CHUNK_SIZE * self.tilemap.tile_size
+
+        # offgrid decor and spawners are bucketed by the chunk they sit in
+        self.offgrid = {}
+        self.spawners = {}
+        self.player_spawn = None
+        for tile in self.map_file.offgrid:
+            key = (int(tile['pos'][0] // self.chunk_px), int(tile['pos'][1] // self.chunk_px))
+            if tile['type'] == SPAWNER_TYPE and tile['variant'] == 0:
+                self.player_spawn = list(tile['pos'])
+            elif tile['type'] == SPAWNER_TYPE and tile['variant'] == 1:
+                self.spawners.setdefault(key, []).append(list(tile['pos']))
+            else:
+                self.offgrid.setdefault(key, []).append(tile)
+        self.regions = set(self.map_file.chunk_offsets) | set(self.offgrid) | set(self.spawners)
+
+        # enemies parked in regions that aren't resident, restored when the region streams back in
+        self.dormant = {}
+        self.visited = set()
+        self.resident = set()
+        self.pending = set()
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+
+    def read(self, key):
+        chunk = None
+        spawners = []
+        if key in self.map_file.chunk_offsets:
+            chunk = self.map_file.read_chunk(key, self.table)
+            # spawners placed on the grid turn into entities instead of tiles
+            for i in range(CHUNK_SIZE * CHUNK_SIZE):
+                if chunk.types[i] == self.spawner_id and chunk.variants[i] < 2:
+                    pos = [((key[0] * CHUNK_SIZE) + (i % CHUNK_SIZE)) * self.tilemap.tile_size,
+                           ((key[1] * CHUNK_SIZE) + (i // CHUNK_SIZE)) * self.tilemap.tile_size]
+                    spawners.append((chunk.variants[i], pos))
+                    chunk.types[i] = 0
+                    chunk.variants[i] = 0
+                    chunk.count -= 1
+        return chunk, spawners
+
+    def worker(self):
+        while True:
+            key = self.requests.get()
+            if key is None:
+                break
+            self.results.put((key,) + self.read(key))
+
+    def chunk_key(self, pos):
+        return int(pos[0] // self.chunk_px), int(pos[1] // self.chunk_px)
+
+    def find_player_spawn(self):
+        if self.player_spawn:
+            return self.player_spawn
+        for key in self.map_file.chunk_offsets:
+            for variant, pos in self.read(key)[1]:
+                if variant == 0:
+                    return pos
+
+    def wanted(self, center, radius):
+        cx, cy = self.chunk_key(center)
+        return {(x, y) for x in range(cx - radius, cx + radius + 1) for y in range(cy - radius, cy + radius + 1)
+                if (x, y) in self.regions}
+
+    def activate(self, key, chunk, spawners):
+        self.resident.add(key)
+        if chunk and chunk.count:
+            self.tilemap.add_chunk(key, chunk)
+        for tile in self.offgrid.get(key, []):
+            self.tilemap.add_offgrid(tile)
+
+        positions = self.dormant.pop(key, [])
+        if key not in self.visited:
+            # spawners only fire the first time a region streams in
+            self.visited.add(key)
+            positions += self.spawners.get(key, []) + [pos for variant, pos in spawners if variant]
+        for pos in positions:
+            self.game.enemies.add(pos)
+
+    def deactivate(self, key):
+        self.resident.discard(key)
+        self.tilemap.remove_chunk(key)
+        for tile in self.offgrid.get(key, []):
+            self.tilemap.remove_offgrid(tile)
+        self.park(key)
+
+    def park(self, key):
+        enemies = self.game.enemies
+        keys = np.floor_divide(enemies.pos[:len(enemies)], self.chunk_px).astype(int)
+        indices = np.flatnonzero((keys[:, 0] == key[0]) & (keys[:, 1] == key[1]))
+        if len(indices):
+            self.dormant.setdefault(key, []).extend(enemies.take(indices))
+
+    def load_around(self, center):
+        # blocking load, used when a level starts so the first frame has ground under the player
+        for key in self.wanted(center, self.radius):
+            if key not in self.resident:
+                self.activate(key, *self.read(key))
+
+    def update(self, center):
+        for key in self.wanted(center, self.radius):
+            if key not in self.resident and key not in self.pending:
+                self.pending.add(key)
+                self.requests.put(key)
+
+        keep = self.wanted(center, self.radius + 1)
+        while True:
+            try:
+                key, chunk, spawners = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending.discard(key)
+            # the camera may have moved on while the worker was reading, in that case the chunk is dropped
+            if key in keep and key not in self.resident:
+                self.activate(key, chunk, spawners)
+
+        for key in list(self.resident):
+            if key not in keep:
+                self.deactivate(key)
+
+        # enemies that walked or fell out of the resident area wait until it streams back in
+        enemies = self.game.enemies
+        if len(enemies):
+            keys = np.floor_divide(enemies.pos[:len(enemies)], self.chunk_px).astype(int)
+            for key in {tuple(key) for key in keys.tolist()} - self.resident:
+                self.park(key)
+
+    def close(self):
+        self.requests.put(None)
+        self.thread.join()
+        self.map_file.close()
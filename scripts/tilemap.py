@@ -1,7 +1,17 @@
 import json
+import math
+import mmap
+import os
+import struct
+import zlib
+from bisect import bisect_right
 
+import numpy as np
 import pygame
 
+from scripts.spatial_hash import SpatialHash
+from scripts.utils import silhouette
+
 AUTOTILE_MAP = {
     tuple(sorted([(1, 0), (0, 1)])): 0,
     tuple(sorted([(1, 0), (0, 1), (-1, 0)])): 1,
@@ -14,35 +24,327 @@ AUTOTILE_MAP = {
     tuple(sorted([(1, 0), (-1, 0), (0, 1), (0, -1)])): 8,
 }
 
+# neighbor sets as bitmasks, bit i set when AUTOTILE_SHIFTS[i] holds the same type, -1 leaves the variant alone
+AUTOTILE_SHIFTS = [(1, 0), (-1, 0), (0, -1), (0, 1)]
+AUTOTILE_VARIANTS = np.full(16, -1, dtype=np.int16)
+for neighbors, autotile_variant in AUTOTILE_MAP.items():
+    AUTOTILE_VARIANTS[sum(1 << AUTOTILE_SHIFTS.index(shift) for shift in neighbors)] = autotile_variant
+
 NEIGHBOR_OFFSETS = [(-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (0, 0), (-1, 1), (0, 1), (1, 1)]
 PHYSICS_TILES = {'grass', 'stone', 'default', 'platform'}
 AUTOTILE_TYPES = {'grass', 'stone'}
 
+# chunks are CHUNK_SIZE x CHUNK_SIZE tiles, addressed with shifts so negative coords floor correctly
+CHUNK_SHIFT = 4
+CHUNK_SIZE = 1 << CHUNK_SHIFT
+CHUNK_MASK = CHUNK_SIZE - 1
+
+# binary maps: header, type name table, raw chunk type/variant arrays, then offgrid tiles
+# the header ends with the crc32 of the json the map was baked from, 0 when it wasn't baked from one
+MAP_MAGIC = b'RLMP'
+MAP_VERSION = 2
+MAP_HEADER = struct.Struct('<4sHHHHIII')
+CHUNK_HEADER = struct.Struct('<ii')
+OFFGRID_ENTRY = struct.Struct('<BBdd')
+
+# pixel size of the buckets offgrid decor is indexed in
+OFFGRID_CELL_SIZE = 64
+
+EMPTY_SPANS = ((), ())
+
+
+def source_checksum(path):
+    f = open(path, 'rb')
+    data = f.read()
+    f.close()
+    return zlib.crc32(data)
+
+
+def map_path(base):
+    # the binary map is a load cache of the json, only used while it was baked from the json as it is now
+    json_path = base + '.json'
+    binary_path = base + '.map'
+    if not os.path.exists(binary_path):
+        return json_path
+    if not os.path.exists(json_path):
+        return binary_path
+    f = open(binary_path, 'rb')
+    header = f.read(MAP_HEADER.size)
+    f.close()
+    if len(header) == MAP_HEADER.size:
+        magic, version, *sizes, source = MAP_HEADER.unpack(header)
+        if magic == MAP_MAGIC and version == MAP_VERSION and source == source_checksum(json_path):
+            return binary_path
+    return json_path
+
+
+class Chunk:
+    def __init__(self):
+        # type id 0 means empty, otherwise it's an index into Tilemap.tile_types + 1
+        self.types = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+        self.variants = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+        self.count = 0
+        # baked surface and drop shadow of every tile in the chunk, dropped whenever a tile in it changes
+        self.surf = None
+        self.shadow = None
+
+
+class MapFile:
+    # read-only view of a binary map, chunks are sliced out of the mmap on demand
+    def __init__(self, path):
+        self.f = open(path, 'rb')
+        self.data = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.tile_size, self.chunk_size, type_count, chunk_count, offgrid_count, self.source = \
+            MAP_HEADER.unpack_from(self.data)
+        if magic != MAP_MAGIC or version != MAP_VERSION:
+            self.close()
+            raise ValueError(f'{path} is not a version {MAP_VERSION} map')
+        offset = MAP_HEADER.size
+
+        self.types = []
+        for i in range(type_count):
+            length = self.data[offset]
+            self.types.append(self.data[offset + 1:offset + 1 + length].decode())
+            offset += 1 + length
+
+        self.area = self.chunk_size * self.chunk_size
+        self.chunk_offsets = {}
+        for i in range(chunk_count):
+            self.chunk_offsets[CHUNK_HEADER.unpack_from(self.data, offset)] = offset + CHUNK_HEADER.size
+            offset += CHUNK_HEADER.size + self.area * 2
+
+        self.offgrid = []
+        for i in range(offgrid_count):
+            type_index, variant, x, y = OFFGRID_ENTRY.unpack_from(self.data, offset)
+            offset += OFFGRID_ENTRY.size
+            self.offgrid.append({'type': self.types[type_index - 1], 'variant': variant, 'pos': [x, y]})
+
+    def read_raw(self, key, table):
+        offset = self.chunk_offsets[key]
+        return (self.data[offset:offset + self.area].translate(table),
+                self.data[offset + self.area:offset + self.area * 2])
+
+    def read_chunk(self, key, table):
+        types, variants = self.read_raw(key, table)
+        chunk = Chunk()
+        chunk.types[:] = types
+        chunk.variants[:] = variants
+        chunk.count = self.area - types.count(0)
+        return chunk
+
+    def close(self):
+        self.data.close()
+        self.f.close()
+
 
 class Tilemap:
     def __init__(self, game, tile_size=16):
         self.game = game
         self.tile_size = tile_size
-        self.tilemap = {}
-        self.offgrid_tiles = []
+        self.chunks = {}
+        self.tile_types = []
+        self.type_ids = {}
+        self.physics_ids = bytearray(256)
+        # (type id, variant) -> ordered set of the chunks holding such tiles, kept up to date as tiles and chunks come
+        # in, and (type, variant) -> offgrid keys
+        # a chunk can stay listed after losing its last such tile, queries drop it when they find nothing there
+        self.tile_index = {}
+        self.offgrid_by_type = {}
+        # offgrid tiles by insertion number, which is also their draw order, plus a spatial index built on first query
+        self.offgrid_tiles = {}
+        self.offgrid_keys = {}
+        self.offgrid_index = None
+        self.next_offgrid = 0
+        self.offgrid_shadows = {}
+        self.solid_cache = None
+        self.span_cache = None
+        # index scratch for solid_tiles(out=...), grown to the largest lookup seen
+        self.lookup = np.zeros(0, dtype=int)
+
+    def clear(self):
+        self.chunks = {}
+        self.tile_index = {}
+        self.offgrid_by_type = {}
+        self.offgrid_tiles = {}
+        self.offgrid_keys = {}
+        self.offgrid_index = None
+        self.solid_cache = None
+
+    def type_id(self, tile_type):
+        if tile_type not in self.type_ids:
+            self.tile_types.append(tile_type)
+            self.type_ids[tile_type] = len(self.tile_types)
+            self.physics_ids[len(self.tile_types)] = tile_type in PHYSICS_TILES
+        return self.type_ids[tile_type]
+
+    def get_id(self, x, y):
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk:
+            return chunk.types[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)]
+        return 0
+
+    def get_tile(self, x, y):
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk:
+            i = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+            if chunk.types[i]:
+                return {'type': self.tile_types[chunk.types[i] - 1], 'variant': chunk.variants[i], 'pos': [x, y]}
+
+    def index_tile(self, tile_id, variant, key):
+        chunks = self.tile_index.get((tile_id, variant))
+        if chunks is None:
+            chunks = self.tile_index[(tile_id, variant)] = {}
+        chunks[key] = None
+
+    def index_chunks(self, chunks, add=True):
+        # the (type id, variant) pairs in each of the (key, chunk) pairs, found with array ops, so a whole map is
+        # indexed as it loads without a python loop over its cells
+        if not chunks:
+            return
+        types = np.frombuffer(b''.join(chunk.types for key, chunk in chunks), dtype=np.uint8)
+        variants = np.frombuffer(b''.join(chunk.variants for key, chunk in chunks), dtype=np.uint8)
+        cells = np.flatnonzero(types)
+        # one entry per chunk and pair, in chunk order
+        found = np.unique(cells // (CHUNK_SIZE * CHUNK_SIZE) << 16 | types[cells].astype(int) << 8 | variants[cells])
+        for entry in found.tolist():
+            key = chunks[entry >> 16][0]
+            pair = ((entry >> 8) & 0xFF, entry & 0xFF)
+            if add:
+                self.index_tile(pair[0], pair[1], key)
+            else:
+                listed = self.tile_index.get(pair)
+                if listed is not None:
+                    listed.pop(key, None)
+                    if not listed:
+                        del self.tile_index[pair]
+
+    def tile_locations(self, tile_id, variant):
+        chunks = self.tile_index.get((tile_id, variant))
+        if not chunks:
+            return []
+        locations = []
+        for key in list(chunks):
+            chunk = self.chunks.get(key)
+            cells = np.flatnonzero((np.frombuffer(chunk.types, dtype=np.uint8) == tile_id)
+                                   & (np.frombuffer(chunk.variants, dtype=np.uint8) == variant)) if chunk else ()
+            if not len(cells):
+                del chunks[key]
+                continue
+            locations.extend(zip(((key[0] << CHUNK_SHIFT) | (cells & CHUNK_MASK)).tolist(),
+                                 ((key[1] << CHUNK_SHIFT) | (cells >> CHUNK_SHIFT)).tolist()))
+        if not chunks:
+            del self.tile_index[(tile_id, variant)]
+        return locations
+
+    def set_tile(self, x, y, tile_type, variant=0):
+        key = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(key)
+        if not chunk:
+            chunk = self.chunks[key] = Chunk()
+        i = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        tile_id = self.type_id(tile_type)
+        if chunk.types[i] == tile_id and chunk.variants[i] == variant:
+            return False
+        if not chunk.types[i]:
+            chunk.count += 1
+        self.index_tile(tile_id, variant, key)
+        chunk.types[i] = tile_id
+        chunk.variants[i] = variant
+        chunk.surf = None
+        chunk.shadow = None
+        self.solid_cache = None
+        return True
+
+    def remove_tile(self, x, y):
+        key = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(key)
+        if chunk:
+            i = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+            if chunk.types[i]:
+                chunk.types[i] = 0
+                chunk.variants[i] = 0
+                chunk.count -= 1
+                chunk.surf = None
+                chunk.shadow = None
+                self.solid_cache = None
+                if not chunk.count:
+                    del self.chunks[key]
+                return True
+        return False
+
+    def offgrid_rect(self, tile):
+        # types without images, like spawners in the game, get a one tile box
+        if tile['type'] not in self.game.assets:
+            return pygame.Rect(tile['pos'][0], tile['pos'][1], self.tile_size, self.tile_size)
+        img = self.game.assets[tile['type']][tile['variant']]
+        return pygame.Rect(tile['pos'][0], tile['pos'][1], img.get_width(), img.get_height())
+
+    def add_offgrid(self, tile):
+        key = self.next_offgrid
+        self.next_offgrid += 1
+        self.offgrid_tiles[key] = tile
+        self.offgrid_keys[id(tile)] = key
+        self.offgrid_by_type.setdefault((tile['type'], tile['variant']), {})[key] = None
+        if self.offgrid_index is not None:
+            self.offgrid_index.insert(key, self.offgrid_rect(tile))
+
+    def remove_offgrid(self, tile):
+        key = self.offgrid_keys.pop(id(tile), None)
+        if key is not None:
+            del self.offgrid_tiles[key]
+            keys = self.offgrid_by_type[(tile['type'], tile['variant'])]
+            del keys[key]
+            if not keys:
+                del self.offgrid_by_type[(tile['type'], tile['variant'])]
+            if self.offgrid_index is not None:
+                self.offgrid_index.remove(key)
+
+    def offgrid_in(self, rect):
+        # tiles whose buckets touch rect, in draw order, may include a few just outside it
+        if self.offgrid_index is None:
+            self.offgrid_index = SpatialHash(OFFGRID_CELL_SIZE)
+            for key, tile in self.offgrid_tiles.items():
+                self.offgrid_index.insert(key, self.offgrid_rect(tile))
+        return [self.offgrid_tiles[key] for key in sorted(self.offgrid_index.query(rect))]
+
+    def offgrid_at(self, pos):
+        return [tile for tile in self.offgrid_in((pos[0], pos[1], 0, 0)) if self.offgrid_rect(tile).collidepoint(pos)]
+
+    def tiles(self):
+        for (cx, cy), chunk in self.chunks.items():
+            types = chunk.types
+            for i in range(CHUNK_SIZE * CHUNK_SIZE):
+                if types[i]:
+                    yield {'type': self.tile_types[types[i] - 1], 'variant': chunk.variants[i],
+                           'pos': [(cx << CHUNK_SHIFT) | (i & CHUNK_MASK), (cy << CHUNK_SHIFT) | (i >> CHUNK_SHIFT)]}
 
     def extract(self, id_pairs, keep=False):
+        # walks the (type, variant) indexes, so the cost follows the number of matches rather than the map size
+        id_pairs = list(dict.fromkeys(tuple(pair) for pair in id_pairs))
+        offgrid_keys = sorted(key for pair in id_pairs for key in self.offgrid_by_type.get(pair, ()))
         matches = []
-        for tile in self.offgrid_tiles.copy():
-            if (tile['type'], tile['variant']) in id_pairs:
-                matches.append(tile.copy())
-                if not keep:
-                    self.offgrid_tiles.remove(tile)
-
-        for loc in self.tilemap:
-            tile = self.tilemap[loc]
-            if (tile['type'], tile['variant']) in id_pairs:
-                matches.append(tile.copy())
-                matches[-1]['pos'] = matches[-1]['pos'].copy()
-                matches[-1]['pos'][0] *= self.tile_size
-                matches[-1]['pos'][1] *= self.tile_size
-                if not keep:
-                    del self.tilemap[loc]
+        for key in offgrid_keys:
+            tile = self.offgrid_tiles[key]
+            matches.append(tile.copy())
+            if not keep:
+                self.remove_offgrid(tile)
+
+        locations = []
+        for tile_type, variant in id_pairs:
+            if tile_type in self.type_ids:
+                locations.extend(self.tile_locations(self.type_ids[tile_type], variant))
+        if locations:
+            # same order as a scan over tiles(): chunk order, then row major inside the chunk
+            chunk_order = {key: n for n, key in enumerate(self.chunks)}
+            locations.sort(key=lambda loc: (chunk_order[(loc[0] >> CHUNK_SHIFT, loc[1] >> CHUNK_SHIFT)],
+                                            loc[1] & CHUNK_MASK, loc[0] & CHUNK_MASK))
+        for x, y in locations:
+            tile = self.get_tile(x, y)
+            if not keep:
+                self.remove_tile(x, y)
+            tile['pos'][0] *= self.tile_size
+            tile['pos'][1] *= self.tile_size
+            matches.append(tile)
 
         return matches
 
@@ -50,68 +352,375 @@ class Tilemap:
         tiles = []
         tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
         for offset in NEIGHBOR_OFFSETS:
-            check_loc = str(tile_loc[0] + offset[0]) + ';' + str(tile_loc[1] + offset[1])
-            if check_loc in self.tilemap:
-                tiles.append(self.tilemap[check_loc])
+            tile = self.get_tile(tile_loc[0] + offset[0], tile_loc[1] + offset[1])
+            if tile:
+                tiles.append(tile)
         return tiles
 
-    def save(self, path):
+    def save(self, path, source=None):
+        if path.endswith('.map'):
+            return self.save_binary(path, source)
+
+        tilemap = {}
+        for tile in self.tiles():
+            tilemap[str(tile['pos'][0]) + ';' + str(tile['pos'][1])] = tile
         f = open(path, 'w')
-        json.dump({'tilemap': self.tilemap, 'tile_size': self.tile_size, 'offgrid': self.offgrid_tiles}, f)
+        json.dump({'tilemap': tilemap, 'tile_size': self.tile_size, 'offgrid': list(self.offgrid_tiles.values())}, f)
+        f.close()
+
+    def save_binary(self, path, source=None):
+        # source is the json this map is baked from, map_path only loads the map while that json is unchanged
+        for tile in self.offgrid_tiles.values():
+            self.type_id(tile['type'])
+
+        f = open(path, 'wb')
+        f.write(MAP_HEADER.pack(MAP_MAGIC, MAP_VERSION, self.tile_size, CHUNK_SIZE, len(self.tile_types),
+                                len(self.chunks), len(self.offgrid_tiles), source_checksum(source) if source else 0))
+        for tile_type in self.tile_types:
+            name = tile_type.encode()
+            f.write(bytes([len(name)]) + name)
+        for (cx, cy), chunk in self.chunks.items():
+            f.write(CHUNK_HEADER.pack(cx, cy))
+            f.write(chunk.types)
+            f.write(chunk.variants)
+        for tile in self.offgrid_tiles.values():
+            f.write(OFFGRID_ENTRY.pack(self.type_ids[tile['type']], tile['variant'], tile['pos'][0], tile['pos'][1]))
         f.close()
 
     def load(self, path):
+        if path.endswith('.map'):
+            return self.load_binary(path)
+
         f = open(path, 'r')
         map_data = json.load(f)
         f.close()
 
-        self.tilemap = map_data['tilemap']
+        self.clear()
         self.tile_size = map_data['tile_size']
-        self.offgrid_tiles = map_data['offgrid']
+        for tile in map_data['tilemap'].values():
+            self.set_tile(int(tile['pos'][0]), int(tile['pos'][1]), tile['type'], tile['variant'])
+        for tile in map_data['offgrid']:
+            self.add_offgrid(tile)
+
+    def type_table(self, types):
+        # maps file type ids onto this tilemap's ids, used with bytes.translate
+        table = bytearray(256)
+        for i, tile_type in enumerate(types):
+            table[i + 1] = self.type_id(tile_type)
+        return bytes(table)
+
+    def add_chunk(self, key, chunk):
+        self.remove_chunk(key)
+        self.chunks[key] = chunk
+        self.index_chunks([(key, chunk)])
+        self.solid_cache = None
+
+    def remove_chunk(self, key):
+        chunk = self.chunks.pop(key, None)
+        if chunk:
+            self.index_chunks([(key, chunk)], add=False)
+            self.solid_cache = None
+
+    def load_binary(self, path):
+        map_file = MapFile(path)
+        try:
+            self.clear()
+            self.tile_size = map_file.tile_size
+            table = self.type_table(map_file.types)
+            size = map_file.chunk_size
+            for key in map_file.chunk_offsets:
+                if size == CHUNK_SIZE:
+                    chunk = map_file.read_chunk(key, table)
+                    if chunk.count:
+                        self.chunks[key] = chunk
+                else:
+                    types, variants = map_file.read_raw(key, table)
+                    for j in range(size * size):
+                        if types[j]:
+                            self.set_tile(key[0] * size + j % size, key[1] * size + j // size,
+                                          self.tile_types[types[j] - 1], variants[j])
+            if size == CHUNK_SIZE:
+                # chunks of the engine's size went in whole above, index them in one pass
+                self.index_chunks(list(self.chunks.items()))
+            for tile in map_file.offgrid:
+                self.add_offgrid(dict(tile, pos=list(tile['pos'])))
+        finally:
+            map_file.close()
 
     def solid_check(self, pos):
-        tile_loc = str(int(pos[0] // self.tile_size)) + ';' + str(int(pos[1] // self.tile_size))
-        if tile_loc in self.tilemap:
-            if self.tilemap[tile_loc]['type'] in PHYSICS_TILES:
-                return self.tilemap[tile_loc]
+        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+        if self.physics_ids[self.get_id(*tile_loc)]:
+            return self.get_tile(*tile_loc)
 
     def entity_check(self, pos, entity):
-        tile_loc = str(int(pos[0] // self.tile_size)) + ';' + str(int(pos[1] // self.tile_size))
-        if tile_loc in self.tilemap:
-            if self.tilemap[tile_loc]['type'] == entity:
-                return self.tilemap[tile_loc]
-
-    def physics_rects_around(self, pos):
-        rects = []
-        for tile in self.tiles_around(pos):
-            if tile['type'] in PHYSICS_TILES:
-                rects.append(
-                    pygame.Rect(tile['pos'][0] * self.tile_size, tile['pos'][1] * self.tile_size, self.tile_size,
-                                self.tile_size))
-        return rects
+        tile_loc = (int(pos[0] // self.tile_size), int(pos[1] // self.tile_size))
+        tile_id = self.get_id(*tile_loc)
+        if tile_id and tile_id == self.type_ids.get(entity):
+            return self.get_tile(*tile_loc)
+
+    def type_grids(self):
+        # dense type id and variant arrays indexed [y, x] covering every chunk, plus the tile coords of the top left
+        if not self.chunks:
+            return (0, 0), np.zeros((1, 1), dtype=np.uint8), np.zeros((1, 1), dtype=np.uint8)
+        min_cx = min(key[0] for key in self.chunks)
+        min_cy = min(key[1] for key in self.chunks)
+        max_cx = max(key[0] for key in self.chunks)
+        max_cy = max(key[1] for key in self.chunks)
+        shape = ((max_cy - min_cy + 1) * CHUNK_SIZE, (max_cx - min_cx + 1) * CHUNK_SIZE)
+        types = np.zeros(shape, dtype=np.uint8)
+        variants = np.zeros(shape, dtype=np.uint8)
+        side = (CHUNK_SIZE, CHUNK_SIZE)
+        for (cx, cy), chunk in self.chunks.items():
+            x = (cx - min_cx) * CHUNK_SIZE
+            y = (cy - min_cy) * CHUNK_SIZE
+            types[y:y + CHUNK_SIZE, x:x + CHUNK_SIZE] = np.frombuffer(chunk.types, dtype=np.uint8).reshape(side)
+            variants[y:y + CHUNK_SIZE, x:x + CHUNK_SIZE] = np.frombuffer(chunk.variants, dtype=np.uint8).reshape(side)
+        return (min_cx * CHUNK_SIZE, min_cy * CHUNK_SIZE), types, variants
+
+    def solid_grid(self):
+        # bool bitmap of physics tiles indexed [y, x], plus the tile coords of its top left corner
+        # it has a one tile open border, so lookups clamped into it see everything outside the map as open
+        if self.solid_cache is None:
+            origin, types, variants = self.type_grids()
+            physics = np.frombuffer(self.physics_ids, dtype=np.uint8).astype(bool)
+            grid = np.zeros((types.shape[0] + 2, types.shape[1] + 2), dtype=bool)
+            grid[1:-1, 1:-1] = physics[types]
+            self.solid_cache = ((origin[0] - 1, origin[1] - 1), grid)
+        return self.solid_cache
+
+    def solid_spans(self):
+        # runs of solid tiles along every row and column of the solid grid, rebuilt whenever the grid is
+        # (row spans by tile y, column spans by tile x), each line maps to sorted run starts and exclusive ends
+        origin, grid = self.solid_grid()
+        if self.span_cache is None or self.span_cache[0] is not grid:
+            self.span_cache = (grid, self.runs(grid, origin[1], origin[0]), self.runs(grid.T, origin[0], origin[1]))
+        return self.span_cache[1:]
+
+    @staticmethod
+    def runs(grid, line_origin, run_origin):
+        padded = np.zeros((grid.shape[0], grid.shape[1] + 2), dtype=np.int8)
+        padded[:, 1:-1] = grid
+        edges = np.diff(padded, axis=1)
+        lines, starts = np.nonzero(edges == 1)
+        ends = np.nonzero(edges == -1)[1]
+        spans = {}
+        for line, start, end in zip(lines.tolist(), starts.tolist(), ends.tolist()):
+            line_starts, line_ends = spans.setdefault(line + line_origin, ([], []))
+            line_starts.append(start + run_origin)
+            line_ends.append(end + run_origin)
+        return spans
+
+    def sweep(self, rect, axis, target):
+        # slides rect along axis (0 is x, 1 is y) to the pixel coord target, stopping flush against the first solid
+        # tile on the way however far that is, returns the coord it reached and whether it was blocked
+        start = rect[axis]
+        size = rect.size[axis]
+        across = rect[1 - axis]
+        lines = range(across // self.tile_size, (across + rect.size[1 - axis] - 1) // self.tile_size + 1)
+        spans = self.solid_spans()[axis]
+        hit = None
+        if target > start:
+            # tiles the rect already overlaps are skipped, only the ones it moves into can block it
+            first = (start + size - 1) // self.tile_size + 1
+            last = (target + size - 1) // self.tile_size
+            for line in lines:
+                starts, ends = spans.get(line, EMPTY_SPANS)
+                i = bisect_right(ends, first)
+                if i < len(starts) and starts[i] <= last:
+                    tile = max(starts[i], first)
+                    hit = tile if hit is None else min(hit, tile)
+            if hit is not None:
+                return hit * self.tile_size - size, True
+        elif target < start:
+            first = start // self.tile_size - 1
+            last = target // self.tile_size
+            for line in lines:
+                starts, ends = spans.get(line, EMPTY_SPANS)
+                i = bisect_right(starts, first) - 1
+                if i >= 0 and ends[i] > last:
+                    tile = min(ends[i] - 1, first)
+                    hit = tile if hit is None else max(hit, tile)
+            if hit is not None:
+                return (hit + 1) * self.tile_size, True
+        return target, False
+
+    def solid_tiles(self, tile_x, tile_y, out=None):
+        # vectorized solid check over arrays of tile coords, anything outside the map is open
+        # a bool out of the same shape is filled in place, the lookup itself runs in reused scratch
+        origin, grid = self.solid_grid()
+        height, width = grid.shape
+        size = np.size(tile_x)
+        if len(self.lookup) < size * 2:
+            self.lookup = np.zeros(size * 2, dtype=int)
+        x = self.lookup[:size].reshape(np.shape(tile_x))
+        index = self.lookup[size:size * 2].reshape(np.shape(tile_x))
+        np.subtract(tile_x, origin[0], out=x)
+        np.clip(x, 0, width - 1, out=x)
+        np.subtract(tile_y, origin[1], out=index)
+        np.clip(index, 0, height - 1, out=index)
+        index *= width
+        index += x
+        return np.take(grid.ravel(), index, out=out, mode='clip')
+
+    def raycast(self, start, end):
+        # walks the tiles under the segment in order (grid dda), returns the point where it first enters a solid
+        # tile and that tile's coords, or None when nothing is in the way
+        x, y = int(start[0] // self.tile_size), int(start[1] // self.tile_size)
+        if self.physics_ids[self.get_id(x, y)]:
+            return tuple(start), (x, y)
+        end_x, end_y = int(end[0] // self.tile_size), int(end[1] // self.tile_size)
+        dx = end[0] - start[0]
+        dy = end[1] - start[1]
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        # segment fraction at the next vertical and horizontal grid line, and between consecutive ones
+        t_max_x = ((x + (dx > 0)) * self.tile_size - start[0]) / dx if dx else math.inf
+        t_max_y = ((y + (dy > 0)) * self.tile_size - start[1]) / dy if dy else math.inf
+        t_delta_x = self.tile_size / abs(dx) if dx else math.inf
+        t_delta_y = self.tile_size / abs(dy) if dy else math.inf
+        for i in range(abs(end_x - x) + abs(end_y - y)):
+            # once an axis reaches the end tile only the other one can step, which keeps rounding from overshooting
+            if y == end_y or (x != end_x and t_max_x < t_max_y):
+                x += step_x
+                t = t_max_x
+                t_max_x += t_delta_x
+            else:
+                y += step_y
+                t = t_max_y
+                t_max_y += t_delta_y
+            if self.physics_ids[self.get_id(x, y)]:
+                return (start[0] + dx * t, start[1] + dy * t), (x, y)
+        return None
+
+    def occluded(self, start, end):
+        return self.raycast(start, end) is not None
+
+    def line_of_sight(self, starts, ends):
+        # batched occlusion test, True where a segment is clear, ends may be a single shared point
+        # the order tiles are crossed in doesn't matter here, so every grid line crossing of every segment is
+        # computed at once rather than stepping the dda
+        starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+        ends = np.broadcast_to(np.asarray(ends, dtype=float), starts.shape)
+        delta = ends - starts
+        cell = (starts // self.tile_size).astype(int)
+        end_cell = (ends // self.tile_size).astype(int)
+        step = np.where(delta > 0, 1, -1)
+        moving = delta != 0
+        t_max = np.divide((cell + (delta > 0)) * self.tile_size - starts, delta, out=np.full(delta.shape, np.inf),
+                          where=moving)
+        t_delta = np.divide(self.tile_size, np.abs(delta), out=np.full(delta.shape, np.inf), where=moving)
+        low = np.minimum(cell, end_cell)
+        high = np.maximum(cell, end_cell)
+
+        blocked = self.solid_tiles(cell[:, 0], cell[:, 1])
+        for axis in (0, 1):
+            other = 1 - axis
+            counts = np.abs(end_cell[:, axis] - cell[:, axis])
+            ray = np.repeat(np.arange(len(starts)), counts)
+            k = np.arange(len(ray)) - np.repeat(np.cumsum(counts) - counts, counts)
+            t = t_max[ray, axis] + k * t_delta[ray, axis]
+            crossing = np.empty((len(ray), 2), dtype=int)
+            crossing[:, axis] = cell[ray, axis] + step[ray, axis] * (k + 1)
+            # on a tile corner the dda steps y first, so the other coord rounds to match
+            along = (starts[ray, other] + delta[ray, other] * t) / self.tile_size
+            if axis == 0:
+                along = np.where(delta[ray, other] < 0, np.ceil(along) - 1, np.floor(along))
+            else:
+                along = np.where(delta[ray, other] > 0, np.ceil(along) - 1, np.floor(along))
+            crossing[:, other] = np.clip(along, low[ray, other], high[ray, other])
+            blocked[ray[self.solid_tiles(crossing[:, 0], crossing[:, 1])]] = True
+        return ~blocked
 
     def autotile(self):
-        for loc in self.tilemap:
-            tile = self.tilemap[loc]
-            neighbors = set()
-            for shift in [(1, 0), (-1, 0), (0, -1), (0, 1)]:
-                check_loc = str(tile['pos'][0] + shift[0]) + ';' + str(tile['pos'][1] + shift[1])
-                if check_loc in self.tilemap:
-                    if self.tilemap[check_loc]['type'] == tile['type']:
-                        neighbors.add(shift)
-            neighbors = tuple(sorted(neighbors))
-            if (tile['type'] in AUTOTILE_TYPES) and (neighbors in AUTOTILE_MAP):
-                tile['variant'] = AUTOTILE_MAP[neighbors]
-
-    def render(self, surf, offset=(0, 0)):
-        for tile in self.offgrid_tiles:
-            surf.blit(self.game.assets[tile['type']][tile['variant']],
-                      (tile['pos'][0] - offset[0], tile['pos'][1] - offset[1]))
-
-        for x in range(offset[0] // self.tile_size, (offset[0] + surf.get_width()) // self.tile_size + 1):
-            for y in range(offset[1] // self.tile_size, (offset[1] + surf.get_height()) // self.tile_size + 1):
-                loc = str(x) + ';' + str(y)
-                if loc in self.tilemap:
-                    tile = self.tilemap[loc]
-                    surf.blit(self.game.assets[tile['type']][tile['variant']], (
-                        tile['pos'][0] * self.tile_size - offset[0], tile['pos'][1] * self.tile_size - offset[1]))
+        # whole map at once: neighbor bitmasks come from shifted comparisons of the dense type grid
+        origin, types, variants = self.type_grids()
+        padded = np.pad(types, 1)
+        h, w = types.shape
+        result = variants.astype(np.int16)
+        for tile_type in AUTOTILE_TYPES & set(self.type_ids):
+            tile_id = self.type_ids[tile_type]
+            mask = np.zeros(types.shape, dtype=np.uint8)
+            for bit, (dx, dy) in enumerate(AUTOTILE_SHIFTS):
+                mask |= (padded[1 + dy:1 + dy + h, 1 + dx:1 + dx + w] == tile_id).astype(np.uint8) << bit
+            new = AUTOTILE_VARIANTS[mask]
+            update = (types == tile_id) & (new >= 0)
+            result[update] = new[update]
+        result = result.astype(np.uint8)
+
+        changed = []
+        for (cx, cy), chunk in self.chunks.items():
+            x = cx * CHUNK_SIZE - origin[0]
+            y = cy * CHUNK_SIZE - origin[1]
+            chunk_variants = result[y:y + CHUNK_SIZE, x:x + CHUNK_SIZE].tobytes()
+            if chunk_variants != chunk.variants:
+                chunk.variants[:] = chunk_variants
+                chunk.surf = None
+                chunk.shadow = None
+                changed.append(((cx, cy), chunk))
+        self.index_chunks(changed)
+
+    def autotile_variant(self, x, y, tile_type, variant=0):
+        # the variant autotiling would pick for tile_type at x, y, or variant when the type or neighbor set has none
+        tile_id = self.type_ids.get(tile_type)
+        if tile_type not in AUTOTILE_TYPES or not tile_id:
+            return variant
+        mask = 0
+        for bit, (dx, dy) in enumerate(AUTOTILE_SHIFTS):
+            if self.get_id(x + dx, y + dy) == tile_id:
+                mask |= 1 << bit
+        return int(AUTOTILE_VARIANTS[mask]) if AUTOTILE_VARIANTS[mask] >= 0 else variant
+
+    def autotile_tile(self, x, y):
+        tile = self.get_tile(x, y)
+        if not tile or tile['type'] not in AUTOTILE_TYPES:
+            return False
+        return self.set_tile(x, y, tile['type'], self.autotile_variant(x, y, tile['type'], tile['variant']))
+
+    def autotile_around(self, x, y):
+        # an edit only changes the neighbor sets of the cell itself and the four cells next to it
+        changed = self.autotile_tile(x, y)
+        for dx, dy in AUTOTILE_SHIFTS:
+            changed = self.autotile_tile(x + dx, y + dy) or changed
+        return changed
+
+    def bake_chunk(self, chunk):
+        chunk_px = CHUNK_SIZE * self.tile_size
+        surf = pygame.Surface((chunk_px, chunk_px))
+        surf.fill((255, 0, 255))
+        surf.set_colorkey((255, 0, 255))
+        for i in range(CHUNK_SIZE * CHUNK_SIZE):
+            if chunk.types[i]:
+                surf.blit(self.game.assets[self.tile_types[chunk.types[i] - 1]][chunk.variants[i]],
+                          ((i & CHUNK_MASK) * self.tile_size, (i >> CHUNK_SHIFT) * self.tile_size))
+        chunk.surf = surf
+        return surf
+
+    def bake_shadow(self, chunk):
+        chunk.shadow = silhouette(chunk.surf or self.bake_chunk(chunk))
+        return chunk.shadow
+
+    def offgrid_shadow(self, tile):
+        key = (tile['type'], tile['variant'])
+        if key not in self.offgrid_shadows:
+            self.offgrid_shadows[key] = silhouette(self.game.assets[tile['type']][tile['variant']])
+        return self.offgrid_shadows[key]
+
+    def render(self, surf, offset=(0, 0), shadow=None):
+        # only chunks and decor overlapping the clip area, which is the whole surface unless a caller narrowed it
+        clip = surf.get_clip()
+        for tile in self.offgrid_in((offset[0] + clip.x, offset[1] + clip.y, clip.width, clip.height)):
+            render_pos = (tile['pos'][0] - offset[0], tile['pos'][1] - offset[1])
+            surf.blit(self.game.assets[tile['type']][tile['variant']], render_pos)
+            if shadow:
+                shadow.blit(self.offgrid_shadow(tile), render_pos, special_flags=pygame.BLEND_RGBA_MAX)
+
+        chunk_px = CHUNK_SIZE * self.tile_size
+        for cx in range((offset[0] + clip.left) // chunk_px, (offset[0] + clip.right) // chunk_px + 1):
+            for cy in range((offset[1] + clip.top) // chunk_px, (offset[1] + clip.bottom) // chunk_px + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk:
+                    render_pos = (cx * chunk_px - offset[0], cy * chunk_px - offset[1])
+                    surf.blit(chunk.surf or self.bake_chunk(chunk), render_pos)
+                    if shadow:
+                        shadow.blit(chunk.shadow or self.bake_shadow(chunk), render_pos,
+                                    special_flags=pygame.BLEND_RGBA_MAX)
@@ -2,16 +2,36 @@ import os
 
 import pygame
 
+from scripts.atlas import Atlas
+
 BASE_IMG_PATH = 'data/images/'
+ATLAS_CACHE_PATH = 'data/cache/'
+SHADOW_COLOR = (0, 0, 0, 50)
+
+atlas = None
+
+
+def load_atlas():
+    # packs every image into one cached surface, load_image/load_images then hand out subsurfaces of it
+    global atlas
+    atlas = Atlas.load(BASE_IMG_PATH, ATLAS_CACHE_PATH)
 
 
 def load_image(path):
+    if atlas and path in atlas:
+        return atlas.image(path)
     img = pygame.image.load(BASE_IMG_PATH + path).convert()
     img.set_colorkey((255, 0, 255))
     return img
 
 
+def silhouette(img):
+    return pygame.mask.from_surface(img).to_surface(setcolor=SHADOW_COLOR, unsetcolor=(0, 0, 0, 0))
+
+
 def load_images(path):
+    if atlas:
+        return atlas.images(path)
     images = []
     for img_name in sorted(os.listdir(BASE_IMG_PATH + path)):
         images.append(load_image(path + '/' + img_name))
@@ -19,15 +39,18 @@ def load_images(path):
 
 
 class Animation:
-    def __init__(self, images, img_dur=5, loop=True):
+    def __init__(self, images, img_dur=5, loop=True, shadows=None, frames=None):
         self.images = images
+        # every variant is built once here and shared by copies, indexed by flip then frame
+        self.frames = frames or (images, [pygame.transform.flip(img, True, False) for img in images])
+        self.shadows = shadows or tuple([silhouette(img) for img in frames] for frames in self.frames)
         self.loop = loop
         self.img_duration = img_dur
         self.done = False
         self.frame = 0
 
     def copy(self):
-        return Animation(self.images, self.img_duration, self.loop)
+        return Animation(self.images, self.img_duration, self.loop, self.shadows, self.frames)
 
     def update(self):
         if self.loop:
@@ -37,5 +60,12 @@ class Animation:
             if self.frame >= self.img_duration * len(self.images) - 1:
                 self.done = True
 
-    def img(self):
-        return self.images[int(self.frame / self.img_duration)]
\ No newline at end of file
+    def img(self, flip=False):
+        return self.frames[flip][int(self.frame / self.img_duration)]
+
+    def shadow(self, flip=False):
+        return self.shadows[flip][int(self.frame / self.img_duration)]
+
+
+def load_animation(path, img_dur=5, loop=True):
+    return Animation(load_images(path), img_dur, loop)
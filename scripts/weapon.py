@@ -7,20 +7,28 @@ class Weapon:
         self.rect_pos = list(pos)
         self.flip = False
         self.hitbox_size = list(hitbox_size)
-        # self.hitbox = pygame.Rect(self.rect_pos, self.hitbox_size)
+        # how far the shot gets before a wall, at most the hitbox width
+        self.reach = self.hitbox_size[0]
+        self.hitbox = pygame.Rect(self.rect_pos, self.hitbox_size)
 
     # def damage(self, value, flip):
     #     self.flip = flip
 
     def rect(self):
-        return pygame.Rect(self.rect_pos, self.hitbox_size)
+        self.hitbox.update(self.rect_pos, (self.reach, self.hitbox_size[1]))
+        return self.hitbox
 
-    def update(self, pos, size, flip):
+    def update(self, pos, size, flip, tilemap):
         self.flip = flip
         self.rect_pos[1] = pos[1]
+        muzzle = pos[0] if self.flip else pos[0] + size[1]
+        # cast along the middle of the hitbox so the shot stops at the first solid tile
+        y = pos[1] + self.hitbox_size[1] / 2
+        hit = tilemap.raycast((muzzle, y), (muzzle + (-self.hitbox_size[0] if self.flip else self.hitbox_size[0]), y))
+        self.reach = int(abs(hit[0][0] - muzzle)) if hit else self.hitbox_size[0]
         if self.flip:
-            self.rect_pos[0] = pos[0] - self.hitbox_size[0]
+            self.rect_pos[0] = muzzle - self.reach
         else:
-            self.rect_pos[0] = pos[0] + size[1]
+            self.rect_pos[0] = muzzle
 
 